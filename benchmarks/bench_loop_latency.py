@@ -0,0 +1,162 @@
+"""
+Event loop latency during a large media transfer.
+
+Streams a synthetic download to disk and hashes the result, once with the file I/O done
+inline on the event loop (what Telethon's download/upload does by default) and once through
+`media_transfer.stream_download` / `UploadCache.digest`, which run every read and write in a
+worker thread. A ticker task measures how late the loop wakes it up while the transfer runs.
+
+Slow or network-mounted storage can be simulated with --io-delay-ms, which adds that much
+blocking time to every read and write call.
+
+    python benchmarks/bench_loop_latency.py --size-mb 256 --io-delay-ms 5
+"""
+
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_transfer  # noqa: E402
+
+TICK_SECONDS = 0.001
+
+
+class SyntheticClient:
+    """Stands in for TelegramClient.iter_download, yielding parts from memory."""
+
+    def __init__(self, size: int, part_size: int):
+        self.size = size
+        self.part = os.urandom(part_size)
+
+    def iter_download(self, media, offset=0, request_size=None):
+        client = self
+
+        class Stream:
+            def __init__(self):
+                self.sent = 0
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                if self.sent >= client.size:
+                    raise StopAsyncIteration
+                await asyncio.sleep(0)  # a network read yields to the loop
+                self.sent += len(client.part)
+                return client.part
+
+            async def close(self):
+                pass
+
+        return Stream()
+
+
+def slow_io(delay: float):
+    """Wrap os-level file calls so that every read and write blocks for `delay` seconds."""
+    import builtins
+
+    real_open = builtins.open
+
+    class SlowFile:
+        def __init__(self, f):
+            self._f = f
+
+        def write(self, data):
+            time.sleep(delay)
+            return self._f.write(data)
+
+        def read(self, *args):
+            time.sleep(delay)
+            return self._f.read(*args)
+
+        def __getattr__(self, name):
+            return getattr(self._f, name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self._f.close()
+
+    def patched_open(*args, **kwargs):
+        return SlowFile(real_open(*args, **kwargs))
+
+    return patched_open
+
+
+async def measure(transfer) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await transfer()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick_task
+    lags.sort()
+    return {
+        "seconds": elapsed,
+        "p50_ms": statistics.median(lags),
+        "p99_ms": lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0],
+        "max_ms": lags[-1],
+        "ticks": len(lags),
+    }
+
+
+async def inline_transfer(client, path: str) -> None:
+    """Baseline: writes and hashing happen directly on the event loop."""
+    with open(path, "wb") as f:
+        async for chunk in client.iter_download(None):
+            f.write(chunk)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(media_transfer.UPLOAD_PART_SIZE), b""):
+            digest.update(block)
+            await asyncio.sleep(0)
+
+
+async def offloaded_transfer(client, path: str) -> None:
+    await media_transfer.stream_download(client, None, path)
+    await media_transfer.UploadCache(":memory:").digest(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--io-delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import builtins
+
+    if args.io_delay_ms:
+        builtins.open = slow_io(args.io_delay_ms / 1000)
+
+    client = SyntheticClient(args.size_mb * 1024 * 1024, media_transfer.PART_SIZE)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "media.bin")
+        print(f"{args.size_mb} MiB transfer, {args.io_delay_ms} ms simulated I/O latency")
+        print(f"{'mode':<12}{'seconds':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'ticks':>8}")
+        for name, transfer in (("inline", inline_transfer), ("offloaded", offloaded_transfer)):
+            result = asyncio.run(measure(lambda: transfer(client, path)))
+            print(
+                f"{name:<12}{result['seconds']:>9.2f}{result['p50_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['max_ms']:>9.2f}{result['ticks']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
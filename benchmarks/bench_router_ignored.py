@@ -0,0 +1,105 @@
+"""
+Router cost per ignored message.
+
+Feeds synthetic new-message updates from chats that are not monitored through the same
+steps as Telethon's update dispatch (build the event, apply the builder's filter, call the
+handler), once with the previous registration (a catch-all `events.NewMessage` whose handler
+prints every message before checking the chat) and once with the router as registered by
+`start_mcp.register_router` (a `chats=` filter built from the routing rules).
+
+The Docker image runs with PYTHONUNBUFFERED=1, so the previous handler's prints go to a
+line-buffered sink here, one write per line like in production. Telethon builds the event
+before any filter runs, so that construction is the floor for both variants.
+
+    python benchmarks/bench_router_ignored.py --messages 50000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_router_")
+os.environ.setdefault("TELEGRAM_API_ID", "1")
+os.environ.setdefault("TELEGRAM_API_HASH", "x")
+os.environ.setdefault("TELEGRAM_SESSION_NAME", os.path.join(_tmp, "session"))
+os.environ.setdefault("TELEGRAM_MCP_STATE_DB", os.path.join(_tmp, "state.db"))
+
+from telethon import events, types  # noqa: E402
+from telethon.client.updates import EventBuilderDict  # noqa: E402
+
+import start_mcp  # noqa: E402
+
+LEGACY_GROUP = -1002536132364
+
+
+async def legacy_router(event):
+    """The handler body before the chats filter: print, then check the chat."""
+    print(f"[TG] ↪️  Msg from {event.sender_id} in {event.chat_id}: {event.raw_text!r}")
+    if event.chat_id != LEGACY_GROUP and event.sender_id != start_mcp.SUPER_USER_ID:
+        print(f"[IGNORE] Message not from public group or superuser: {event.chat_id}")
+        return
+
+
+def make_updates(count: int) -> list:
+    date = datetime.now(timezone.utc)
+    updates = []
+    for i in range(count):
+        message = types.Message(
+            id=i + 1,
+            peer_id=types.PeerChannel(1000000 + i % 500),
+            date=date,
+            message=f"message {i} in some busy group that is not monitored",
+            from_id=types.PeerUser(5000 + i % 3000),
+        )
+        update = types.UpdateNewChannelMessage(message=message, pts=i + 1, pts_count=1)
+        update._entities = {}
+        updates.append(update)
+    return updates
+
+
+async def dispatch(client, builder, callback, updates) -> float:
+    """Seconds per update spent in build + filter + handler."""
+    if not builder.resolved:
+        await builder.resolve(client)
+    started = time.perf_counter()
+    for update in updates:
+        event = EventBuilderDict(client, update, None)[type(builder)]
+        if not event:
+            continue
+        passed = builder.filter(event)
+        if asyncio.iscoroutine(passed):
+            passed = await passed
+        if passed:
+            await callback(event)
+    return (time.perf_counter() - started) / len(updates)
+
+
+async def main(args) -> None:
+    client = start_mcp.client
+    updates = make_updates(args.messages)
+
+    with open(os.devnull, "w", buffering=1) as sink, contextlib.redirect_stdout(sink):
+        legacy = await dispatch(client, events.NewMessage(), legacy_router, updates)
+        start_mcp.register_router()
+    builder, callback = next(
+        (b, c) for b, c in client._event_builders if c is start_mcp.public_group_message_router
+    )
+    routed = await dispatch(client, builder, callback, updates)
+
+    print(f"{args.messages} ignored messages from {500} unmonitored chats")
+    print(f"catch-all handler + print   {legacy * 1e6:8.2f} us/message")
+    print(f"chats filter + pre-check    {routed * 1e6:8.2f} us/message")
+    print(f"speedup                     {legacy / routed:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
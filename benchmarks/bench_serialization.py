@@ -0,0 +1,147 @@
+"""
+JSON encoding cost on realistic payloads.
+
+Compares the previous encoding (`json.dumps(..., indent=2, default=json_serializer)`) with
+`serialization.dumps` on the standard library backend and, when orjson is installed, on
+orjson. Payloads: one routed webhook event, a 50-event webhook batch, 20 admin log events as
+Telethon `to_dict()` output (nested, with datetimes and bytes) and 500 exported contacts.
+
+    python benchmarks/bench_serialization.py --rounds 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization  # noqa: E402
+
+NOW = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def json_serializer(obj):
+    """The per-object fallback main.py used before serialization.py."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+def routed_event(i: int) -> dict:
+    return {
+        "workflow_type": "group_-1002536132364_chatbot",
+        "message_data": {
+            "sender_id": 100000 + i,
+            "chat_id": -1002536132364,
+            "message_text": f"@satya_agent can you summarise the thread about release {i}? 🙏",
+            "message_id": 48000 + i,
+            "timestamp": (NOW + timedelta(seconds=i)).isoformat(),
+            "is_private": False,
+            "is_group": True,
+            "is_channel": False,
+            "sender_username": f"user{i}",
+            "chat_title": "SATYA Public",
+            "has_media": False,
+        },
+        "timestamp": NOW.isoformat(),
+        "mcp_server": "satya-telegram-mcp.onrender.com",
+    }
+
+
+def admin_event(i: int) -> dict:
+    return {
+        "_": "ChannelAdminLogEvent",
+        "id": 9000000000 + i,
+        "date": NOW - timedelta(minutes=i),
+        "user_id": 200000 + i,
+        "action": {
+            "_": "ChannelAdminLogEventActionEditMessage",
+            "prev_message": {
+                "_": "Message",
+                "id": 5000 + i,
+                "peer_id": {"_": "PeerChannel", "channel_id": 2536132364},
+                "date": NOW - timedelta(minutes=i, seconds=30),
+                "message": "Original text of the message before the edit",
+                "out": False,
+                "entities": [{"_": "MessageEntityBold", "offset": 0, "length": 8}],
+                "file_reference": os.urandom(24),
+            },
+            "new_message": {
+                "_": "Message",
+                "id": 5000 + i,
+                "peer_id": {"_": "PeerChannel", "channel_id": 2536132364},
+                "date": NOW - timedelta(minutes=i, seconds=30),
+                "edit_date": NOW - timedelta(minutes=i),
+                "message": "Edited text of the message",
+                "out": False,
+                "entities": [],
+                "file_reference": os.urandom(24),
+            },
+        },
+    }
+
+
+def contact(i: int) -> dict:
+    return {
+        "id": 300000 + i,
+        "name": f"Contact Number {i}",
+        "type": "user",
+        "username": f"contact_{i}",
+        "phone": f"+1555{i:07d}",
+    }
+
+
+PAYLOADS = {
+    "routed event": routed_event(1),
+    "webhook batch (50)": {
+        "batch": True,
+        "count": 50,
+        "events": [routed_event(i) for i in range(50)],
+    },
+    "admin log (20 events)": [admin_event(i) for i in range(20)],
+    "contacts (500)": [contact(i) for i in range(500)],
+}
+
+
+def previous(obj):
+    return json.dumps(obj, indent=2, default=json_serializer)
+
+
+def stdlib_compact(obj):
+    return serialization._stdlib_dumps(obj, indent=False)
+
+
+def measure(encode, obj, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        encode(obj)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main(args) -> None:
+    encoders = [("indent=2 + default", previous), ("stdlib compact", stdlib_compact)]
+    if serialization.orjson is not None:
+        encoders.append(("orjson compact", serialization.dumps))
+    else:
+        print("orjson is not installed; only the standard library backend is measured\n")
+
+    for name, obj in PAYLOADS.items():
+        print(name)
+        baseline = None
+        for label, encode in encoders:
+            micros = measure(encode, obj, args.rounds)
+            size = len(encode(obj).encode("utf-8"))
+            baseline = baseline or micros
+            print(f"  {label:<20} {micros:9.1f} us   {size:8d} bytes   {baseline / micros:5.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=1000)
+    main(parser.parse_args())
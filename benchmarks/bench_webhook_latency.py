@@ -0,0 +1,123 @@
+"""
+Routing latency to an n8n webhook: a new session per event vs the shared pooled session.
+
+Starts a local mock webhook (aiohttp.web) and posts a realistic routed payload to it, first
+opening a fresh `aiohttp.ClientSession` for every event (what `route_to_n8n_workflow` used
+to do) and then through `webhooks.WebhookClient`, which keeps connections alive. Each mode
+sends the same number of events at the same concurrency and reports p50/p99 latency.
+
+Handshake costs are much larger against a remote HTTPS n8n instance than on loopback, so
+--connect-delay-ms adds that much latency to every new connection accepted by the mock.
+
+    python benchmarks/bench_webhook_latency.py --events 2000 --concurrency 8 --connect-delay-ms 20
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhooks import WebhookClient  # noqa: E402
+
+PAYLOAD = {
+    "workflow_type": "group_-1002536132364_chatbot",
+    "message_data": {
+        "sender_id": 123456789,
+        "chat_id": -1002536132364,
+        "message_text": "@satya_agent what is the status of the deployment?",
+        "message_id": 48213,
+        "timestamp": "2025-01-01T12:00:00",
+        "is_private": False,
+        "is_group": True,
+        "is_channel": False,
+        "sender_username": "someone",
+        "chat_title": "SATYA Public",
+        "has_media": False,
+    },
+    "timestamp": "2025-01-01T12:00:00",
+    "mcp_server": "satya-telegram-mcp.onrender.com",
+}
+
+
+async def start_mock(connect_delay: float) -> web.AppRunner:
+    seen = set()
+
+    async def webhook(request):
+        await request.read()
+        # Charge the handshake cost once per connection (client source port)
+        peer = request.transport.get_extra_info("peername")
+        if connect_delay and peer not in seen:
+            seen.add(peer)
+            await asyncio.sleep(connect_delay)
+        return web.Response(text='{"ok":true}', content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post("/webhook", webhook)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+async def post_fresh_session(url: str) -> None:
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(url, json=PAYLOAD) as response:
+            await response.text()
+
+
+async def measure(send, events: int, concurrency: int) -> list:
+    latencies = []
+    remaining = iter(range(events))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await send()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def report(label: str, latencies: list, elapsed: float) -> None:
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:<22} p50 {cuts[49]:8.2f} ms   p99 {cuts[98]:8.2f} ms   "
+        f"{len(latencies) / elapsed:8.0f} events/s"
+    )
+
+
+async def main(args) -> None:
+    runner = await start_mock(args.connect_delay_ms / 1000)
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}/webhook"
+    print(f"{args.events} events, concurrency {args.concurrency}, mock at {url}\n")
+
+    started = time.perf_counter()
+    latencies = await measure(lambda: post_fresh_session(url), args.events, args.concurrency)
+    report("session per event", latencies, time.perf_counter() - started)
+
+    client = WebhookClient()
+    await client.start()
+    started = time.perf_counter()
+    latencies = await measure(lambda: client.post(url, PAYLOAD), args.events, args.concurrency)
+    report("pooled keep-alive", latencies, time.perf_counter() - started)
+    await client.close()
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--connect-delay-ms", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
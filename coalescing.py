@@ -0,0 +1,171 @@
+"""
+Burst coalescing for routed events.
+
+Events are grouped by a key such as (workflow, chat, sender). The first event of a key is
+delivered immediately; events that follow within the key's window are collected and
+delivered together as one batch, either when the oldest of them has waited `window`
+seconds or as soon as `max_batch` events are pending. All deadlines live in one heap served
+by a single timer task, so the number of keys does not change the number of tasks.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger("telegram_mcp.coalescing")
+
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "50"))
+
+
+class _KeyState:
+    __slots__ = ("window", "window_until", "pending", "deadline")
+
+    def __init__(self, window: float):
+        self.window = window
+        self.window_until = 0.0
+        self.pending: List[Any] = []
+        self.deadline: Optional[float] = None
+
+
+class CoalescingEngine:
+    """
+    Per-key burst coalescing with max-latency and max-batch-size flushes.
+
+    `send_first(key, item)` delivers the event that opens a burst and `send_batch(key, items)`
+    delivers the follow-ups. Both are coroutines; batches run as tracked tasks so that `close`
+    can wait for them.
+    """
+
+    def __init__(
+        self,
+        send_first: Callable[[Hashable, Any], Awaitable[Any]],
+        send_batch: Callable[[Hashable, List[Any]], Awaitable[Any]],
+        max_batch: int = COALESCE_MAX_BATCH,
+    ):
+        self.send_first = send_first
+        self.send_batch = send_batch
+        self.max_batch = max_batch
+        self.states: Dict[Hashable, _KeyState] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._wakeup = None
+        self._sending = set()
+        self.stats = {"immediate": 0, "coalesced": 0, "batches": 0, "size_flushes": 0}
+
+    async def submit(self, key: Hashable, item: Any, window: float) -> bool:
+        """
+        Route `item` for `key`. Returns True if it was sent immediately as the first event of a
+        burst, False if it was queued for the next batch.
+        """
+        now = time.monotonic()
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = _KeyState(window)
+        state.window = window
+
+        if not state.pending and now >= state.window_until:
+            state.window_until = now + window
+            self._schedule(state.window_until, key)
+            self.stats["immediate"] += 1
+            await self.send_first(key, item)
+            return True
+
+        state.pending.append(item)
+        self.stats["coalesced"] += 1
+        if len(state.pending) >= self.max_batch:
+            self.stats["size_flushes"] += 1
+            self._flush(key, state)
+        elif state.deadline is None:
+            state.deadline = now + window
+            self._schedule(state.deadline, key)
+        return False
+
+    def _schedule(self, when: float, key: Hashable) -> None:
+        heapq.heappush(self._heap, (when, next(self._seq), key))
+        if self._timer is None or self._timer.done():
+            self._wakeup = asyncio.Event()
+            self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+        elif self._heap[0][0] == when:
+            self._wakeup.set()  # New earliest deadline
+
+    def _flush(self, key: Hashable, state: _KeyState) -> int:
+        items, state.pending, state.deadline = state.pending, [], None
+        if not items:
+            return 0
+        # Follow-ups restart the window, as the first event did
+        state.window_until = time.monotonic() + state.window
+        self._schedule(state.window_until, key)
+        self.stats["batches"] += 1
+        task = asyncio.get_running_loop().create_task(self._send_batch(key, items))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+        return len(items)
+
+    async def _send_batch(self, key: Hashable, items: List[Any]) -> None:
+        try:
+            await self.send_batch(key, items)
+        except Exception as e:
+            logger.error(f"Failed to send coalesced batch for {key}: {e}")
+
+    async def _run_timer(self) -> None:
+        while self._heap:
+            when, _, key = self._heap[0]
+            delay = when - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            state = self.states.get(key)
+            if state is None:
+                continue
+            now = time.monotonic()
+            if state.deadline is not None and state.deadline <= now:
+                self._flush(key, state)
+            elif not state.pending and state.window_until <= now:
+                del self.states[key]  # Idle key, forget it
+
+    def flush_all(self) -> Dict[Hashable, int]:
+        """Send every pending batch now; returns the number of events flushed per key."""
+        return {
+            key: self._flush(key, state)
+            for key, state in list(self.states.items())
+            if state.pending
+        }
+
+    async def drain(self) -> None:
+        """Wait for the batches that are being sent."""
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Flush everything that is pending and wait for the batches to be delivered."""
+        self.flush_all()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.drain()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        deadlines = [s.deadline for s in self.states.values() if s.deadline is not None]
+        return {
+            **self.stats,
+            "keys": len(self.states),
+            "pending": sum(len(s.pending) for s in self.states.values()),
+            "pending_keys": [
+                {"key": list(key) if isinstance(key, tuple) else key, "pending": len(s.pending)}
+                for key, s in self.states.items()
+                if s.pending
+            ],
+            "next_flush_in": round(min(deadlines) - now, 1) if deadlines else None,
+            "batches_in_flight": len(self._sending),
+        }
@@ -0,0 +1,146 @@
+"""
+Bounded dispatch stage between the Telegram update handler and webhook delivery.
+
+The update handler only enqueues work; a fixed pool of workers runs it. When the queue is full
+the overflow policy decides what gives: "spill" hands the new item to a synchronous spill
+callback (e.g. the durable webhook outbox) and "drop_oldest" discards the oldest queued item.
+Queue depth and queue wait times are tracked for the status report.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import collections
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("telegram_mcp.dispatcher")
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "4"))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", "1000"))
+DISPATCH_OVERFLOW = os.getenv("DISPATCH_OVERFLOW", "spill")
+
+OVERFLOW_POLICIES = ("spill", "drop_oldest")
+
+
+class Dispatcher:
+    """Bounded queue served by a fixed worker pool, with an overflow policy and metrics."""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = DISPATCH_WORKERS,
+        maxsize: int = DISPATCH_QUEUE_SIZE,
+        overflow: str = DISPATCH_OVERFLOW,
+        spill: Optional[Callable[[Any], Any]] = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}, use one of {OVERFLOW_POLICIES}"
+            )
+        if overflow == "spill" and spill is None:
+            raise ValueError("The spill overflow policy needs a spill callback")
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.spill = spill
+        self._queue = None
+        self._tasks = []
+        self._waits = collections.deque(maxlen=1000)
+        self.stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "max_depth": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        """Start the worker pool on the running loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._worker(), name=f"dispatch-{i}") for i in range(self.workers)
+        ]
+
+    def submit(self, item: Any) -> bool:
+        """Queue `item` without blocking. Returns False if the overflow policy diverted it."""
+        if self._queue is None:
+            self.start()
+        self.stats["submitted"] += 1
+        entry = (time.monotonic(), item)
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            if self.overflow == "drop_oldest":
+                _, dropped = self._queue.get_nowait()
+                self._queue.task_done()
+                self._queue.put_nowait(entry)
+                self.stats["dropped"] += 1
+                logger.warning(f"Dispatch queue full, dropped oldest item {dropped!r:.200}")
+                return True
+            self.stats["spilled"] += 1
+            try:
+                self.spill(item)
+            except Exception as e:
+                logger.error(f"Failed to spill dispatch item: {e}")
+            return False
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._queue.qsize())
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, item = await self._queue.get()
+            self._waits.append(time.monotonic() - enqueued_at)
+            try:
+                await self.handler(item)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Dispatch handler failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Let the workers finish what is queued (up to `timeout`) and stop them."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping dispatcher with {self._queue.qsize()} items queued")
+            if self.spill is not None:
+                while not self._queue.empty():
+                    _, item = self._queue.get_nowait()
+                    self.spill(item)
+                    self.stats["spilled"] += 1
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2)
+
+        return {
+            **self.stats,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.maxsize,
+            "workers": len(self._tasks),
+            "overflow": self.overflow,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p99": percentile(0.99),
+        }
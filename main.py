@@ -3,17 +3,19 @@ import sys
 import json
 import time
 import asyncio
+import functools
 import sqlite3
 import logging
 import mimetypes
 from datetime import datetime, timedelta
+from collections import OrderedDict
 from typing import List, Dict, Optional, Union, Any
 
 # Third-party libraries
-import nest_asyncio
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
-from telethon import TelegramClient, functions, utils
+from telethon import functions, types, utils
+from telethon.client.uploads import _resize_photo_if_needed
 from telethon.sessions import StringSession
 from telethon.tl.types import (
     User,
@@ -32,16 +34,18 @@ from telethon.tl.types import (
 )
 import telethon.errors.rpcerrorlist
 
-
-def json_serializer(obj):
-    """Helper function to convert non-serializable objects for JSON serialization."""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    if isinstance(obj, bytes):
-        return obj.decode("utf-8", errors="replace")
-    # Add other non-serializable types as needed
-    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-
+import serialization
+from rpc_scheduler import ScheduledTelegramClient, bulk_priority
+from media_transfer import (
+    MediaCache,
+    ParallelDownloader,
+    ParallelUploader,
+    UnsupportedTransfer,
+    UploadCache,
+    describe_media,
+    stream_download,
+    transfer_progress,
+)
 
 load_dotenv()
 
@@ -54,12 +58,15 @@ SESSION_STRING = os.getenv("TELEGRAM_SESSION_STRING")
 
 mcp = FastMCP("telegram")
 
+# All requests go through the RPC scheduler (rate limits, priorities, flood wait retries)
 if SESSION_STRING:
     # Use the string session if available
-    client = TelegramClient(StringSession(SESSION_STRING), TELEGRAM_API_ID, TELEGRAM_API_HASH)
+    client = ScheduledTelegramClient(
+        StringSession(SESSION_STRING), TELEGRAM_API_ID, TELEGRAM_API_HASH
+    )
 else:
     # Use file-based session
-    client = TelegramClient(TELEGRAM_SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH)
+    client = ScheduledTelegramClient(TELEGRAM_SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH)
 
 # Setup robust logging with both file and console output
 logger = logging.getLogger("telegram_mcp")
@@ -141,6 +148,13 @@ def log_and_format_error(
     # Log the full technical error
     logger.exception(f"{function_name} failed ({context}): {error}")
 
+    # Flood waits the scheduler could not absorb within its deadline are retryable
+    if isinstance(error, telethon.errors.rpcerrorlist.FloodWaitError):
+        return (
+            f"Telegram rate limit reached, retry in {error.seconds} seconds "
+            f"(code: {error_code})."
+        )
+
     # Return a user-friendly message
     return f"An error occurred (code: {error_code}). Check mcp_errors.log for details."
 
@@ -186,6 +200,529 @@ def format_message(message) -> Dict[str, Any]:
     return result
 
 
+# Telegram accepts at most this many message ids per delete/forward request
+MESSAGE_BATCH_SIZE = 100
+
+
+def chunk_ids(ids: List[int], size: int = MESSAGE_BATCH_SIZE) -> List[List[int]]:
+    """Split a list of message ids into ordered chunks of at most `size` ids."""
+    return [ids[i : i + size] for i in range(0, len(ids), size)]
+
+
+async def _delete_message_chunks(chat_id: int, message_ids: List[int]) -> Dict[str, Any]:
+    """
+    Delete messages from one chat in chunks, in order.
+
+    Failures are reported per id: a chunk that raises marks all of its ids as failed, and a
+    chunk whose affected count is lower than its size reports how many ids were not deleted
+    (Telegram does not say which ones).
+    """
+    report = {"chat_id": chat_id, "requested": len(message_ids), "deleted": 0, "failed": {}}
+    try:
+        entity = await client.get_entity(chat_id)
+    except Exception as e:
+        report["failed"] = {str(mid): str(e) for mid in message_ids}
+        return report
+
+    for chunk in chunk_ids(message_ids):
+        try:
+            if isinstance(entity, Channel):
+                request = functions.channels.DeleteMessagesRequest(channel=entity, id=chunk)
+            else:
+                request = functions.messages.DeleteMessagesRequest(id=chunk, revoke=True)
+            affected = await client(request)
+            report["deleted"] += affected.pts_count
+            if affected.pts_count < len(chunk):
+                report.setdefault("not_deleted_in_chunks", []).append(
+                    {
+                        "first_id": chunk[0],
+                        "last_id": chunk[-1],
+                        "missing": len(chunk) - affected.pts_count,
+                    }
+                )
+        except Exception as e:
+            logger.exception(f"delete chunk failed (chat_id={chat_id}, ids={chunk})")
+            for mid in chunk:
+                report["failed"][str(mid)] = str(e)
+    return report
+
+
+async def _forward_message_chunks(
+    from_chat_id: int, message_ids: List[int], to_chat_id: int
+) -> Dict[str, Any]:
+    """
+    Forward messages to one chat in chunks, preserving their order.
+
+    Telegram returns the forwarded copies aligned with the requested ids, so ids that could
+    not be forwarded (deleted, protected content, ...) are reported individually.
+    """
+    report = {
+        "to_chat_id": to_chat_id,
+        "requested": len(message_ids),
+        "forwarded": {},
+        "failed": {},
+    }
+    try:
+        from_entity = await client.get_entity(from_chat_id)
+        to_entity = await client.get_entity(to_chat_id)
+    except Exception as e:
+        report["failed"] = {str(mid): str(e) for mid in message_ids}
+        return report
+
+    for chunk in chunk_ids(message_ids):
+        try:
+            sent = await client.forward_messages(to_entity, chunk, from_entity)
+            for mid, new_msg in zip(chunk, sent):
+                if new_msg is None:
+                    report["failed"][str(mid)] = "not forwarded"
+                else:
+                    report["forwarded"][str(mid)] = new_msg.id
+        except Exception as e:
+            logger.exception(
+                f"forward chunk failed (from={from_chat_id}, to={to_chat_id}, ids={chunk})"
+            )
+            for mid in chunk:
+                report["failed"][str(mid)] = str(e)
+    return report
+
+
+async def gather_rate_limited(
+    factories: List[Any], concurrency: int = 5, min_interval: float = 0.2
+) -> List[Any]:
+    """
+    Run coroutine factories concurrently with a cap on in-flight calls and a minimum delay
+    between consecutive starts, returning results (or exceptions) in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start_lock = asyncio.Lock()
+    last_start = [0.0]
+
+    async def run(factory):
+        async with semaphore:
+            async with start_lock:
+                wait = last_start[0] + min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                last_start[0] = time.monotonic()
+            return await factory()
+
+    return await asyncio.gather(*[run(f) for f in factories], return_exceptions=True)
+
+
+# Persistent state (broadcast jobs, caches) lives next to the script unless overridden
+STATE_DB_PATH = os.getenv(
+    "TELEGRAM_MCP_STATE_DB", os.path.join(script_dir, "telegram_mcp_state.db")
+)
+
+# Telegram's documented send limits: ~30 messages/second overall, 1 message/second per
+# private chat and 20 messages/minute per group.
+BROADCAST_GLOBAL_PER_SECOND = float(os.getenv("BROADCAST_GLOBAL_PER_SECOND", "30"))
+BROADCAST_USER_INTERVAL = float(os.getenv("BROADCAST_USER_INTERVAL", "1"))
+BROADCAST_GROUP_INTERVAL = float(os.getenv("BROADCAST_GROUP_INTERVAL", "3"))
+
+# Bounds of the in-memory index of messages sent by this account; the full index is kept in
+# STATE_DB_PATH for SENT_INDEX_RETENTION_DAYS so it survives restarts
+SENT_INDEX_PER_CHAT = int(os.getenv("SENT_INDEX_PER_CHAT", "1000"))
+SENT_INDEX_MAX_CHATS = int(os.getenv("SENT_INDEX_MAX_CHATS", "1000"))
+SENT_INDEX_RETENTION_DAYS = float(os.getenv("SENT_INDEX_RETENTION_DAYS", "30"))
+
+
+class SentMessageIndex:
+    """
+    Index of the ids of messages this account sent, so that a reply can be checked against
+    its reply_to_msg_id without fetching the replied-to message. The most recent ids of the
+    most recently active chats are kept in memory; every id is also stored in SQLite, which
+    answers for older messages and for messages sent before a restart. Ids older than
+    `retention_days` are pruned when the table is opened and then at most hourly by `add`.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        per_chat: int = SENT_INDEX_PER_CHAT,
+        max_chats: int = SENT_INDEX_MAX_CHATS,
+        retention_days: float = SENT_INDEX_RETENTION_DAYS,
+    ):
+        self.db_path = db_path
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.retention_days = retention_days
+        self._db = None
+        self._pruned_at = 0.0
+        self._chats: "OrderedDict[int, OrderedDict[int, None]]" = OrderedDict()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS sent_message_index (
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    sent_at REAL NOT NULL,
+                    PRIMARY KEY (chat_id, message_id)
+                ) WITHOUT ROWID;
+                """)
+            self.prune()
+        return self._db
+
+    def prune(self) -> None:
+        """Delete ids older than the retention period."""
+        self._pruned_at = time.time()
+        with self.db:
+            self.db.execute(
+                "DELETE FROM sent_message_index WHERE sent_at < ?",
+                (self._pruned_at - self.retention_days * 86400,),
+            )
+
+    def _remember(self, chat_id: int, message_id: int) -> None:
+        ids = self._chats.get(chat_id)
+        if ids is None:
+            ids = self._chats[chat_id] = OrderedDict()
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        ids[message_id] = None
+        if len(ids) > self.per_chat:
+            ids.popitem(last=False)
+
+    def add(self, chat_id: int, message_id: int) -> None:
+        self._remember(chat_id, message_id)
+        try:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO sent_message_index VALUES (?, ?, ?)",
+                    (chat_id, message_id, time.time()),
+                )
+            if time.time() - self._pruned_at > 3600:
+                self.prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist sent message {chat_id}/{message_id}: {e}")
+
+    def add_sent(self, sent) -> None:
+        """Record the Message (or list of Messages) returned by a send call."""
+        for message in sent if isinstance(sent, list) else [sent]:
+            if message is not None and message.chat_id is not None:
+                self.add(message.chat_id, message.id)
+
+    def contains(self, chat_id: int, message_id: int) -> bool:
+        ids = self._chats.get(chat_id)
+        if ids is not None and message_id in ids:
+            return True
+        try:
+            row = self.db.execute(
+                "SELECT 1 FROM sent_message_index WHERE chat_id = ? AND message_id = ?",
+                (chat_id, message_id),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not look up sent message {chat_id}/{message_id}: {e}")
+            return False
+        if row is not None:
+            self._remember(chat_id, message_id)
+        return row is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {"chats": len(self._chats), "messages": sum(map(len, self._chats.values()))}
+
+
+sent_messages = SentMessageIndex(STATE_DB_PATH)
+
+
+class BroadcastQueue:
+    """
+    Persistent queue of broadcast jobs backed by SQLite.
+
+    Every target chat of a job is a row that moves from 'pending' to 'sent' or 'failed', so a
+    restart resumes exactly where the previous process stopped. A single worker task drains
+    the queue while honouring a global send rate and a per-chat interval, and sleeps through
+    FloodWaitError instead of failing the target.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._db = None
+        self._task = None
+        self._chat_ready_at: Dict[int, float] = {}
+        self._next_send_at = 0.0
+        self.flood_waits = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    message TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS broadcast_targets (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    message_id INTEGER,
+                    error TEXT,
+                    sent_at REAL,
+                    PRIMARY KEY (job_id, position)
+                );
+                """)
+        return self._db
+
+    def create_job(self, chat_ids: List[int], message: str) -> str:
+        job_id = os.urandom(6).hex()
+        with self.db:
+            self.db.execute(
+                "INSERT INTO broadcast_jobs (job_id, message, status, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, message, "running", time.time()),
+            )
+            self.db.executemany(
+                "INSERT INTO broadcast_targets (job_id, position, chat_id) VALUES (?, ?, ?)",
+                [(job_id, i, chat_id) for i, chat_id in enumerate(chat_ids)],
+            )
+        return job_id
+
+    def cancel_job(self, job_id: str) -> int:
+        with self.db:
+            self.db.execute(
+                "UPDATE broadcast_jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+            cur = self.db.execute(
+                "UPDATE broadcast_targets SET status = 'cancelled' "
+                "WHERE job_id = ? AND status = 'pending'",
+                (job_id,),
+            )
+        return cur.rowcount
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.db.execute(
+            "SELECT * FROM broadcast_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+        counts = dict(
+            self.db.execute(
+                "SELECT status, COUNT(*) FROM broadcast_targets WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            ).fetchall()
+        )
+        failed = self.db.execute(
+            "SELECT chat_id, error FROM broadcast_targets WHERE job_id = ? AND status = 'failed'",
+            (job_id,),
+        ).fetchall()
+        total = sum(counts.values())
+        sent = counts.get("sent", 0)
+        result = {
+            "job_id": job_id,
+            "status": job["status"],
+            "total": total,
+            "sent": sent,
+            "failed": counts.get("failed", 0),
+            "pending": counts.get("pending", 0),
+            "failed_chats": {str(row["chat_id"]): row["error"] for row in failed},
+            "flood_waits": self.flood_waits,
+        }
+        if job["started_at"]:
+            elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+            rate = sent / elapsed if elapsed > 0 else 0.0
+            result["elapsed_seconds"] = round(elapsed, 1)
+            result["messages_per_second"] = round(rate, 2)
+            if rate > 0 and result["pending"]:
+                result["eta_seconds"] = round(result["pending"] / rate, 1)
+        return result
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT job_id FROM broadcast_jobs ORDER BY created_at DESC LIMIT 20"
+        ).fetchall()
+        return [self.status(row["job_id"]) for row in rows]
+
+    def ensure_worker(self) -> None:
+        """Start the worker on the running loop unless one is already draining the queue."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def resume(self) -> None:
+        """Restart delivery of jobs left pending by a previous process."""
+        pending = self.db.execute(
+            "SELECT 1 FROM broadcast_jobs WHERE status = 'running' LIMIT 1"
+        ).fetchone()
+        if pending:
+            logger.info("Resuming pending broadcast jobs")
+            self.ensure_worker()
+
+    def _next_target(self) -> Optional[sqlite3.Row]:
+        return self.db.execute("""
+            SELECT t.job_id, t.position, t.chat_id, j.message, j.started_at
+            FROM broadcast_targets t JOIN broadcast_jobs j ON j.job_id = t.job_id
+            WHERE j.status = 'running' AND t.status = 'pending'
+            ORDER BY j.created_at, t.position
+            LIMIT 1
+            """).fetchone()
+
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready_at = max(self._next_send_at, self._chat_ready_at.get(chat_id, 0.0))
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        now = time.monotonic()
+        interval = BROADCAST_GROUP_INTERVAL if chat_id < 0 else BROADCAST_USER_INTERVAL
+        self._next_send_at = now + 1.0 / BROADCAST_GLOBAL_PER_SECOND
+        self._chat_ready_at[chat_id] = now + interval
+
+    def _finish_jobs(self) -> None:
+        with self.db:
+            self.db.execute(
+                """
+                UPDATE broadcast_jobs SET status = 'done', finished_at = ?
+                WHERE status = 'running' AND NOT EXISTS (
+                    SELECT 1 FROM broadcast_targets t
+                    WHERE t.job_id = broadcast_jobs.job_id AND t.status = 'pending'
+                )
+                """,
+                (time.time(),),
+            )
+
+    async def _run(self) -> None:
+        with bulk_priority():
+            await self._drain()
+
+    async def _drain(self) -> None:
+        while True:
+            target = self._next_target()
+            if target is None:
+                self._finish_jobs()
+                return
+            if target["started_at"] is None:
+                with self.db:
+                    self.db.execute(
+                        "UPDATE broadcast_jobs SET started_at = ? WHERE job_id = ?",
+                        (time.time(), target["job_id"]),
+                    )
+            key = (target["job_id"], target["position"])
+            chat_id = target["chat_id"]
+            await self._wait_for_slot(chat_id)
+            try:
+                entity = await client.get_input_entity(chat_id)
+                sent = await client.send_message(entity, target["message"])
+                sent_messages.add_sent(sent)
+                self._mark(key, "sent", message_id=sent.id)
+            except telethon.errors.rpcerrorlist.FloodWaitError as e:
+                self.flood_waits += 1
+                logger.error(f"Broadcast flood wait of {e.seconds}s at chat {chat_id}")
+                await asyncio.sleep(e.seconds + 1)
+            except Exception as e:
+                logger.error(f"Broadcast to chat {chat_id} failed: {e}")
+                self._mark(key, "failed", error=str(e))
+            self._finish_jobs()
+
+    def _mark(self, key, status: str, message_id: int = None, error: str = None) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE broadcast_targets SET status = ?, message_id = ?, error = ?, sent_at = ? "
+                "WHERE job_id = ? AND position = ?",
+                (status, message_id, error, time.time(), *key),
+            )
+
+
+broadcast_queue = BroadcastQueue(STATE_DB_PATH)
+
+# Large documents are transferred over several connections; see media_transfer.py
+media_downloader = ParallelDownloader(client)
+media_uploader = ParallelUploader(client)
+upload_cache = UploadCache(STATE_DB_PATH)
+media_cache = MediaCache(
+    os.getenv("MEDIA_CACHE_DIR", os.path.join(script_dir, "media_cache")),
+    int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(1024**3))),
+)
+
+
+# Structured media metadata per (chat_id, message_id), least recently used evicted first
+MEDIA_INFO_CACHE_SIZE = int(os.getenv("MEDIA_INFO_CACHE_SIZE", "1000"))
+media_info_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+
+async def check_readable_file(file_path: str, label: str = "File") -> Optional[str]:
+    """
+    Return an error message if file_path is not an existing, readable file, else None.
+    The checks run in a worker thread so slow or network storage cannot stall the event loop.
+    """
+
+    def check():
+        if not os.path.isfile(file_path):
+            return f"{label} not found: {file_path}"
+        if not os.access(file_path, os.R_OK):
+            return f"{label} is not readable: {file_path}"
+        return None
+
+    return await asyncio.to_thread(check)
+
+
+async def upload_file_cached(file_path: str, digest: str = None, photo: bool = False):
+    """
+    Upload a file, reusing a recent upload of the same bytes when there is one. With photo=True
+    the image is first scaled down to Telegram's photo limits, as send_file does for paths.
+    """
+    digest = digest or await upload_cache.digest(file_path)
+    key = f"{digest}:photo" if photo else digest
+    input_file = upload_cache.get_file(key)
+    if input_file is None:
+        resized = file_path
+        if photo:
+            resized = await asyncio.to_thread(_resize_photo_if_needed, file_path, True)
+        if resized is file_path:
+            input_file = await media_uploader.upload(file_path)
+        else:
+            input_file = await client.upload_file(resized, file_name=os.path.basename(file_path))
+        upload_cache.put_file(key, input_file)
+    return input_file
+
+
+async def send_file_cached(entity, file_path: str, kind: str = "file", **kwargs):
+    """
+    Send a file, skipping the upload when the same bytes were sent before as the same kind of
+    media. A stale file reference falls back to uploading again.
+    """
+    digest = await upload_cache.digest(file_path)
+    media = upload_cache.get_media(digest, kind)
+    if media is not None:
+        try:
+            return await client.send_file(entity, media, **kwargs)
+        except (
+            telethon.errors.rpcerrorlist.FileReferenceExpiredError,
+            telethon.errors.rpcerrorlist.MediaEmptyError,
+        ):
+            upload_cache.forget_media(digest, kind)
+    if utils.is_image(file_path) and not kwargs.get("force_document"):
+        input_file = await upload_file_cached(file_path, digest, photo=True)
+    else:
+        input_file = await upload_file_cached(file_path, digest)
+        # Telethon can only read duration and dimensions (hachoir) from the path itself
+        kwargs["attributes"], kwargs["mime_type"] = await asyncio.to_thread(
+            functools.partial(
+                utils.get_attributes,
+                file_path,
+                attributes=kwargs.get("attributes"),
+                mime_type=kwargs.get("mime_type"),
+                force_document=kwargs.get("force_document", False),
+                voice_note=kwargs.get("voice_note", False),
+                video_note=kwargs.get("video_note", False),
+                supports_streaming=kwargs.get("supports_streaming", False),
+            )
+        )
+    message = await client.send_file(entity, input_file, **kwargs)
+    upload_cache.put_media(digest, kind, message)
+    return message
+
+
 @mcp.tool()
 async def get_chats(page: int = 1, page_size: int = 20) -> str:
     """
@@ -247,12 +784,65 @@ async def send_message(chat_id: int, message: str) -> str:
     """
     try:
         entity = await client.get_entity(chat_id)
-        await client.send_message(entity, message)
+        sent = await client.send_message(entity, message)
+        sent_messages.add_sent(sent)
         return "Message sent successfully."
     except Exception as e:
         return log_and_format_error("send_message", e, chat_id=chat_id)
 
 
+@mcp.tool()
+async def broadcast_message(chat_ids: list, message: str) -> str:
+    """
+    Queue the same message for delivery to many chats. Delivery runs in the background,
+    respects Telegram's send rates, waits out flood limits and survives restarts.
+    Use get_broadcast_status to follow progress.
+    Args:
+        chat_ids: List of chat IDs to send the message to.
+        message: The message content to send.
+    """
+    try:
+        if not chat_ids:
+            return "No chat IDs given."
+        job_id = broadcast_queue.create_job([int(c) for c in chat_ids], message)
+        broadcast_queue.ensure_worker()
+        return f"Broadcast job {job_id} queued for {len(chat_ids)} chats."
+    except Exception as e:
+        return log_and_format_error("broadcast_message", e, count=len(chat_ids or []))
+
+
+@mcp.tool()
+async def get_broadcast_status(job_id: str = None) -> str:
+    """
+    Get progress and throughput of a broadcast job, or of the most recent jobs.
+    Args:
+        job_id: The broadcast job ID. Omit to list recent jobs.
+    """
+    try:
+        if job_id is None:
+            return serialization.dumps(broadcast_queue.list_jobs())
+        status = broadcast_queue.status(job_id)
+        if status is None:
+            return f"Broadcast job {job_id} not found."
+        return serialization.dumps(status)
+    except Exception as e:
+        return log_and_format_error("get_broadcast_status", e, job_id=job_id)
+
+
+@mcp.tool()
+async def cancel_broadcast(job_id: str) -> str:
+    """
+    Cancel a broadcast job. Chats that already received the message are not affected.
+    Args:
+        job_id: The broadcast job ID.
+    """
+    try:
+        cancelled = broadcast_queue.cancel_job(job_id)
+        return f"Broadcast job {job_id} cancelled ({cancelled} pending chats skipped)."
+    except Exception as e:
+        return log_and_format_error("cancel_broadcast", e, job_id=job_id)
+
+
 @mcp.tool()
 async def list_contacts() -> str:
     """
@@ -1074,12 +1664,11 @@ async def send_file(chat_id: int, file_path: str, caption: str = None) -> str:
         caption: Optional caption for the file.
     """
     try:
-        if not os.path.isfile(file_path):
-            return f"File not found: {file_path}"
-        if not os.access(file_path, os.R_OK):
-            return f"File is not readable: {file_path}"
+        error = await check_readable_file(file_path)
+        if error:
+            return error
         entity = await client.get_entity(chat_id)
-        await client.send_file(entity, file_path, caption=caption)
+        await send_file_cached(entity, file_path, caption=caption)
         return f"File sent to chat {chat_id}."
     except Exception as e:
         return log_and_format_error(
@@ -1087,6 +1676,16 @@ async def send_file(chat_id: int, file_path: str, caption: str = None) -> str:
         )
 
 
+def download_path(media, file_path: str, thumb: bool = False) -> str:
+    """
+    The file client.download_media writes for `file_path`: the media's extension is appended
+    when the path has none, without overwriting an existing file. Cached and streamed
+    downloads use the same rule so every route returns the same path.
+    """
+    extension = ".jpg" if thumb else utils.get_extension(media)
+    return client._get_proper_filename(file_path, "document", extension)
+
+
 @mcp.tool()
 async def download_media(chat_id: int, message_id: int, file_path: str) -> str:
     """
@@ -1101,13 +1700,37 @@ async def download_media(chat_id: int, message_id: int, file_path: str) -> str:
         msg = await client.get_messages(entity, ids=message_id)
         if not msg or not msg.media:
             return "No media found in the specified message."
-        # Check if directory is writable
+        # Check if directory is writable (filesystem checks run off the event loop)
         dir_path = os.path.dirname(file_path) or "."
-        if not os.access(dir_path, os.W_OK):
+        if not await asyncio.to_thread(os.access, dir_path, os.W_OK):
             return f"Directory not writable: {dir_path}"
-        await client.download_media(msg, file=file_path)
-        if not os.path.isfile(file_path):
+        is_dir = await asyncio.to_thread(os.path.isdir, file_path)
+        if not is_dir:
+            file_path = await asyncio.to_thread(download_path, msg.media, file_path)
+        cache_key = None if is_dir else MediaCache.key_for(msg.media)
+        if await media_cache.fetch(cache_key, file_path):
+            return f"Media downloaded to {file_path} (served from local cache)."
+        stats = None
+        if cache_key and media_downloader.supports(msg.media):
+            try:
+                stats = await media_downloader.download(msg.media.document, file_path)
+            except UnsupportedTransfer as e:
+                logger.info(f"Parallel download not possible ({e}), using a single sender")
+        if stats is None:
+            if cache_key:
+                await stream_download(client, msg.media, file_path)
+            else:
+                # Directory targets and non-file media (contacts, web documents, ...)
+                file_path = await client.download_media(msg, file=file_path) or file_path
+        if not await asyncio.to_thread(os.path.isfile, file_path):
             return f"Download failed: file not created at {file_path}"
+        await media_cache.store(cache_key, file_path)
+        if stats:
+            return (
+                f"Media downloaded to {file_path} ({stats['size']} bytes in "
+                f"{stats['seconds']}s, {stats['mb_per_second']} MB/s over "
+                f"{stats['connections']} connections)."
+            )
         return f"Media downloaded to {file_path}."
     except Exception as e:
         return log_and_format_error(
@@ -1115,6 +1738,82 @@ async def download_media(chat_id: int, message_id: int, file_path: str) -> str:
         )
 
 
+@mcp.tool()
+async def download_media_range(
+    chat_id: int, message_id: int, file_path: str, offset: int = 0, length: int = 1048576
+) -> str:
+    """
+    Download only a byte range of the media in a message, e.g. a file header.
+    Args:
+        chat_id: The chat ID.
+        message_id: The message ID containing the media.
+        file_path: Absolute path to save the bytes to (must be writable).
+        offset: Offset of the first byte to fetch.
+        length: Number of bytes to fetch.
+    """
+    try:
+        if offset < 0 or length <= 0:
+            return "offset must be >= 0 and length must be > 0."
+        entity = await client.get_entity(chat_id)
+        msg = await client.get_messages(entity, ids=message_id)
+        if not msg or not msg.media:
+            return "No media found in the specified message."
+        written = await stream_download(client, msg.media, file_path, offset, length)
+        return f"Downloaded {written} bytes at offset {offset} to {file_path}."
+    except Exception as e:
+        return log_and_format_error(
+            "download_media_range",
+            e,
+            chat_id=chat_id,
+            message_id=message_id,
+            offset=offset,
+            length=length,
+        )
+
+
+@mcp.tool()
+async def download_media_thumbnail(chat_id: int, message_id: int, file_path: str) -> str:
+    """
+    Download only the smallest thumbnail of the media in a message.
+    Args:
+        chat_id: The chat ID.
+        message_id: The message ID containing the media.
+        file_path: Absolute path to save the thumbnail to (must be writable).
+    """
+    try:
+        entity = await client.get_entity(chat_id)
+        msg = await client.get_messages(entity, ids=message_id)
+        if not msg or not msg.media:
+            return "No media found in the specified message."
+        cache_key = MediaCache.key_for(msg.media, variant="thumb0")
+        file_path = await asyncio.to_thread(download_path, msg.media, file_path, True)
+        if await media_cache.fetch(cache_key, file_path):
+            return f"Thumbnail saved to {file_path} (served from local cache)."
+        result = await client.download_media(msg, file=file_path, thumb=0)
+        if not result:
+            return "The media in this message has no thumbnail."
+        await media_cache.store(cache_key, result)
+        return f"Thumbnail saved to {result}."
+    except Exception as e:
+        return log_and_format_error(
+            "download_media_thumbnail", e, chat_id=chat_id, message_id=message_id
+        )
+
+
+@mcp.tool()
+async def get_transfer_progress() -> str:
+    """
+    Get progress and throughput of media uploads and downloads that are currently running.
+    """
+    try:
+        transfers = transfer_progress()
+        if not transfers:
+            return "No transfers in progress."
+        return serialization.dumps(transfers)
+    except Exception as e:
+        return log_and_format_error("get_transfer_progress", e)
+
+
 @mcp.tool()
 async def update_profile(first_name: str = None, last_name: str = None, about: str = None) -> str:
     """
@@ -1139,8 +1838,13 @@ async def set_profile_photo(file_path: str) -> str:
     Set a new profile photo.
     """
     try:
+        error = await check_readable_file(file_path, "Photo file")
+        if error:
+            return error
         await client(
-            functions.photos.UploadProfilePhotoRequest(file=await client.upload_file(file_path))
+            functions.photos.UploadProfilePhotoRequest(
+                file=await upload_file_cached(file_path, photo=True)
+            )
         )
         return "Profile photo updated."
     except Exception as e:
@@ -1311,7 +2015,7 @@ async def export_contacts() -> str:
     try:
         result = await client(functions.contacts.GetContactsRequest(hash=0))
         users = result.users
-        return json.dumps([format_entity(u) for u in users], indent=2)
+        return serialization.dumps([format_entity(u) for u in users])
     except Exception as e:
         return log_and_format_error("export_contacts", e)
 
@@ -1369,13 +2073,12 @@ async def edit_chat_photo(chat_id: int, file_path: str) -> str:
     Edit the photo of a chat, group, or channel. Requires a file path to an image.
     """
     try:
-        if not os.path.isfile(file_path):
-            return f"Photo file not found: {file_path}"
-        if not os.access(file_path, os.R_OK):
-            return f"Photo file not readable: {file_path}"
+        error = await check_readable_file(file_path, "Photo file")
+        if error:
+            return error
 
         entity = await client.get_entity(chat_id)
-        uploaded_file = await client.upload_file(file_path)
+        uploaded_file = await upload_file_cached(file_path, photo=True)
 
         if isinstance(entity, Channel):
             # For channels/supergroups, use EditPhotoRequest with InputChatUploadedPhoto
@@ -1867,10 +2570,9 @@ async def send_voice(chat_id: int, file_path: str) -> str:
         file_path: Absolute path to the OGG/OPUS file.
     """
     try:
-        if not os.path.isfile(file_path):
-            return f"File not found: {file_path}"
-        if not os.access(file_path, os.R_OK):
-            return f"File is not readable: {file_path}"
+        error = await check_readable_file(file_path)
+        if error:
+            return error
         mime, _ = mimetypes.guess_type(file_path)
         if not (
             mime
@@ -1882,7 +2584,7 @@ async def send_voice(chat_id: int, file_path: str) -> str:
         ):
             return "Voice file must be .ogg or .opus format."
         entity = await client.get_entity(chat_id)
-        await client.send_file(entity, file_path, voice_note=True)
+        await send_file_cached(entity, file_path, kind="voice", voice_note=True)
         return f"Voice message sent to chat {chat_id}."
     except Exception as e:
         return log_and_format_error("send_voice", e, chat_id=chat_id, file_path=file_path)
@@ -1936,6 +2638,71 @@ async def delete_message(chat_id: int, message_id: int) -> str:
         return log_and_format_error("delete_message", e, chat_id=chat_id, message_id=message_id)
 
 
+@mcp.tool()
+async def delete_messages(chat_id: int, message_ids: list) -> str:
+    """
+    Delete many messages from a chat, batching up to 100 ids per request.
+    Args:
+        chat_id: The chat ID.
+        message_ids: List of message IDs to delete.
+    """
+    try:
+        report = await _delete_message_chunks(chat_id, [int(m) for m in message_ids])
+        return serialization.dumps(report)
+    except Exception as e:
+        return log_and_format_error(
+            "delete_messages", e, chat_id=chat_id, count=len(message_ids or [])
+        )
+
+
+@mcp.tool()
+async def delete_messages_in_chats(targets: list) -> str:
+    """
+    Delete many messages across several chats. Chats are processed in parallel; ids within
+    a chat are deleted in order, in batches of up to 100.
+    Args:
+        targets: List of dicts with 'chat_id' and 'message_ids' keys.
+    """
+    try:
+        with bulk_priority():
+            reports = await asyncio.gather(
+                *[
+                    _delete_message_chunks(int(t["chat_id"]), [int(m) for m in t["message_ids"]])
+                    for t in targets
+                ]
+            )
+        return serialization.dumps(reports)
+    except Exception as e:
+        return log_and_format_error("delete_messages_in_chats", e, targets=len(targets or []))
+
+
+@mcp.tool()
+async def forward_messages(from_chat_id: int, message_ids: list, to_chat_ids: list) -> str:
+    """
+    Forward many messages to one or more chats, batching up to 100 ids per request.
+    Destination chats are processed in parallel and message order is preserved.
+    Args:
+        from_chat_id: The source chat ID.
+        message_ids: List of message IDs to forward.
+        to_chat_ids: List of destination chat IDs.
+    """
+    try:
+        ids = [int(m) for m in message_ids]
+        with bulk_priority():
+            reports = await asyncio.gather(
+                *[_forward_message_chunks(from_chat_id, ids, int(to)) for to in to_chat_ids]
+            )
+        return serialization.dumps(reports)
+    except Exception as e:
+        return log_and_format_error(
+            "forward_messages",
+            e,
+            from_chat_id=from_chat_id,
+            count=len(message_ids or []),
+            to_chat_ids=to_chat_ids,
+        )
+
+
 @mcp.tool()
 async def pin_message(chat_id: int, message_id: int) -> str:
     """
@@ -1975,6 +2742,111 @@ async def mark_as_read(chat_id: int) -> str:
         return log_and_format_error("mark_as_read", e, chat_id=chat_id)
 
 
+@mcp.tool()
+async def mark_chats_as_read(
+    chat_ids: list = None,
+    min_unread: int = None,
+    max_unread: int = None,
+    max_ids: dict = None,
+    concurrency: int = 5,
+    limit: int = None,
+) -> str:
+    """
+    Mark messages as read in many chats at once.
+
+    Chats are either the given chat_ids or, when chat_ids is omitted, every dialog with
+    unread messages. In both cases only chats whose unread count falls within
+    [min_unread, max_unread] are marked. Each chat is only marked read up to its max_id, so
+    messages that arrive after triage stay unread.
+
+    Args:
+        chat_ids: Optional list of chat IDs to mark as read.
+        min_unread: Only select chats with at least this many unread messages.
+        max_unread: Only select chats with at most this many unread messages.
+        max_ids: Optional mapping of chat ID to the last processed message ID. Chats without
+            an entry are marked read up to their newest message at the time of the call.
+        concurrency: Maximum number of read requests in flight.
+        limit: When chat_ids is omitted, scan at most this many dialogs (most recent first).
+    """
+    try:
+        max_ids = {int(k): int(v) for k, v in (max_ids or {}).items()}
+
+        def selected(unread_count: int) -> bool:
+            return not (
+                unread_count == 0
+                or (min_unread is not None and unread_count < min_unread)
+                or (max_unread is not None and unread_count > max_unread)
+            )
+
+        targets = {}
+        report = {"marked": [], "failed": {}}
+        if chat_ids:
+            # Look up just the given chats, 100 per request, instead of scanning all dialogs
+            peers = {}
+            for chat_id in {int(c) for c in chat_ids}:
+                try:
+                    peers[chat_id] = await client.get_input_entity(chat_id)
+                except Exception as e:
+                    report["failed"][str(chat_id)] = str(e)
+            filtered = min_unread is not None or max_unread is not None
+            if filtered or not set(peers).issubset(max_ids):
+                for chunk in chunk_ids(list(peers.values())):
+                    result = await client(
+                        functions.messages.GetPeerDialogsRequest(
+                            peers=[types.InputDialogPeer(peer) for peer in chunk]
+                        )
+                    )
+                    for dialog in result.dialogs:
+                        chat_id = utils.get_peer_id(dialog.peer)
+                        if chat_id not in peers or (
+                            filtered and not selected(dialog.unread_count)
+                        ):
+                            continue
+                        targets[chat_id] = (
+                            peers[chat_id],
+                            max_ids.get(chat_id, dialog.top_message),
+                        )
+                if not filtered:
+                    for chat_id, peer in peers.items():
+                        targets.setdefault(chat_id, (peer, max_ids.get(chat_id)))
+            else:
+                targets = {c: (peer, max_ids[c]) for c, peer in peers.items()}
+        else:
+            async for dialog in client.iter_dialogs(limit=limit):
+                if not selected(dialog.unread_count):
+                    continue
+                top_id = dialog.message.id if dialog.message else 0
+                targets[dialog.id] = (dialog.input_entity, max_ids.get(dialog.id, top_id))
+
+        if not targets and not report["failed"]:
+            return "No chats matched."
+
+        async def acknowledge(peer, max_id):
+            await client.send_read_acknowledge(peer, max_id=max_id or None)
+
+        chat_order = list(targets)
+        with bulk_priority():
+            results = await gather_rate_limited(
+                [lambda c=c: acknowledge(*targets[c]) for c in chat_order],
+                concurrency=concurrency,
+            )
+        for chat_id, result in zip(chat_order, results):
+            if isinstance(result, Exception):
+                logger.error(f"mark_chats_as_read failed for chat {chat_id}: {result}")
+                report["failed"][str(chat_id)] = str(result)
+            else:
+                report["marked"].append({"chat_id": chat_id, "max_id": targets[chat_id][1]})
+        return serialization.dumps(report)
+    except Exception as e:
+        return log_and_format_error(
+            "mark_chats_as_read",
+            e,
+            chat_ids=chat_ids,
+            min_unread=min_unread,
+            max_unread=max_unread,
+        )
+
+
 @mcp.tool()
 async def reply_to_message(chat_id: int, message_id: int, text: str) -> str:
     """
@@ -1982,7 +2854,8 @@ async def reply_to_message(chat_id: int, message_id: int, text: str) -> str:
     """
     try:
         entity = await client.get_entity(chat_id)
-        await client.send_message(entity, text, reply_to=message_id)
+        sent = await client.send_message(entity, text, reply_to=message_id)
+        sent_messages.add_sent(sent)
         return f"Replied to message {message_id} in chat {chat_id}."
     except Exception as e:
         return log_and_format_error(
@@ -1993,17 +2866,27 @@ async def reply_to_message(chat_id: int, message_id: int, text: str) -> str:
 @mcp.tool()
 async def get_media_info(chat_id: int, message_id: int) -> str:
     """
-    Get info about media in a message.
+    Get structured info about media in a message: kind, mime type, size, dimensions,
+    duration, file name and available thumbnail sizes.
     Args:
         chat_id: The chat ID.
         message_id: The message ID.
     """
     try:
-        entity = await client.get_entity(chat_id)
-        msg = await client.get_messages(entity, ids=message_id)
-        if not msg or not msg.media:
-            return "No media found in the specified message."
-        return str(msg.media)
+        key = (chat_id, message_id)
+        info = media_info_cache.get(key)
+        if info is None:
+            entity = await client.get_entity(chat_id)
+            msg = await client.get_messages(entity, ids=message_id)
+            if not msg or not msg.media:
+                return "No media found in the specified message."
+            info = describe_media(msg.media)
+            media_info_cache[key] = info
+            if len(media_info_cache) > MEDIA_INFO_CACHE_SIZE:
+                media_info_cache.popitem(last=False)
+        else:
+            media_info_cache.move_to_end(key)
+        return serialization.dumps(info)
     except Exception as e:
         return log_and_format_error("get_media_info", e, chat_id=chat_id, message_id=message_id)
 
@@ -2155,18 +3038,150 @@ async def unarchive_chat(chat_id: int) -> str:
         return log_and_format_error("unarchive_chat", e, chat_id=chat_id)
 
 
+# Installed sticker sets, refreshed with the GetAllStickers hash, and the documents of each
+# set, refreshed when the set's own hash changes.
+sticker_cache: Dict[str, Any] = {"hash": 0, "sets": [], "contents": {}}
+
+
+async def load_installed_sticker_sets() -> list:
+    """Installed sticker sets; Telegram only resends the list when it changed."""
+    result = await client(functions.messages.GetAllStickersRequest(hash=sticker_cache["hash"]))
+    if isinstance(result, types.messages.AllStickers):
+        sticker_cache["hash"] = result.hash
+        sticker_cache["sets"] = result.sets
+    return sticker_cache["sets"]
+
+
+async def get_sticker_set_contents(input_set, set_hash: int = None) -> Dict[str, Any]:
+    """
+    Documents of a sticker set, by id and by emoji. Cached per set and reused while the
+    set's hash is unchanged.
+    """
+    if isinstance(input_set, types.InputStickerSetID):
+        cached = sticker_cache["contents"].get(input_set.id)
+        if cached and set_hash is not None and cached["set"].hash == set_hash:
+            return cached
+    result = await client(functions.messages.GetStickerSetRequest(stickerset=input_set, hash=0))
+    documents = {d.id: d for d in result.documents}
+    by_emoji: Dict[str, List[int]] = {}
+    for pack in result.packs:
+        by_emoji.setdefault(pack.emoticon, []).extend(pack.documents)
+    contents = {"set": result.set, "documents": documents, "by_emoji": by_emoji}
+    sticker_cache["contents"][result.set.id] = contents
+    return contents
+
+
+async def find_sticker_set(name: str) -> Dict[str, Any]:
+    """Contents of an installed set matched by id, short name or title, else by short name."""
+    for sticker_set in await load_installed_sticker_sets():
+        if name in (str(sticker_set.id), sticker_set.short_name, sticker_set.title):
+            return await get_sticker_set_contents(
+                types.InputStickerSetID(sticker_set.id, sticker_set.access_hash),
+                sticker_set.hash,
+            )
+    return await get_sticker_set_contents(types.InputStickerSetShortName(name))
+
+
+def pick_sticker(contents: Dict[str, Any], emoji: str = None, document_id: int = None):
+    """The sticker of a set's contents with `document_id`, else the first one for `emoji`."""
+    if document_id is not None:
+        return contents["documents"].get(document_id)
+    ids = contents["by_emoji"].get(emoji)
+    return contents["documents"].get(ids[0]) if ids else None
+
+
 @mcp.tool()
 async def get_sticker_sets() -> str:
     """
     Get all sticker sets.
     """
     try:
-        result = await client(functions.messages.GetAllStickersRequest(hash=0))
-        return json.dumps([s.title for s in result.sets], indent=2)
+        sets = await load_installed_sticker_sets()
+        return serialization.dumps([s.title for s in sets])
     except Exception as e:
         return log_and_format_error("get_sticker_sets", e)
 
 
+@mcp.tool()
+async def get_installed_sticker_sets() -> str:
+    """
+    Get all installed sticker sets with their ID, short name, title and sticker count.
+    """
+    try:
+        sets = await load_installed_sticker_sets()
+        return serialization.dumps(
+            [
+                {"id": s.id, "short_name": s.short_name, "title": s.title, "count": s.count}
+                for s in sets
+            ]
+        )
+    except Exception as e:
+        return log_and_format_error("get_installed_sticker_sets", e)
+
+
+@mcp.tool()
+async def get_sticker_set_stickers(sticker_set: str) -> str:
+    """
+    List the stickers of a sticker set with their document IDs and emoji.
+    Args:
+        sticker_set: Set ID, short name or title (installed sets), or a public set short name.
+    """
+    try:
+        contents = await find_sticker_set(sticker_set)
+        emoji_by_id: Dict[int, str] = {}
+        for emoji, ids in contents["by_emoji"].items():
+            for doc_id in ids:
+                emoji_by_id[doc_id] = emoji_by_id.get(doc_id, "") + emoji
+        return serialization.dumps(
+            [{"document_id": d, "emoji": emoji_by_id.get(d, "")} for d in contents["documents"]]
+        )
+    except Exception as e:
+        return log_and_format_error("get_sticker_set_stickers", e, sticker_set=sticker_set)
+
+
+@mcp.tool()
+async def send_sticker_by_reference(
+    chat_id: int, sticker_set: str = None, emoji: str = None, document_id: int = None
+) -> str:
+    """
+    Send a sticker without uploading anything, picked by set and emoji or by document ID.
+    Args:
+        chat_id: The chat ID.
+        sticker_set: Set ID, short name or title. If omitted, all installed sets are searched.
+        emoji: Emoji of the sticker to send (first match in the set).
+        document_id: Document ID of the sticker (see get_sticker_set_stickers).
+    """
+    try:
+        if emoji is None and document_id is None:
+            return "Provide an emoji or a document_id."
+        if sticker_set:
+            document = pick_sticker(await find_sticker_set(sticker_set), emoji, document_id)
+        else:
+            # Sets are fetched one at a time (or taken from the cache) until one has a match
+            document = None
+            for s in await load_installed_sticker_sets():
+                contents = await get_sticker_set_contents(
+                    types.InputStickerSetID(s.id, s.access_hash), s.hash
+                )
+                document = pick_sticker(contents, emoji, document_id)
+                if document is not None:
+                    break
+        if document is None:
+            return "No matching sticker found."
+        entity = await client.get_entity(chat_id)
+        await client.send_file(entity, utils.get_input_document(document))
+        return f"Sticker sent to chat {chat_id}."
+    except Exception as e:
+        return log_and_format_error(
+            "send_sticker_by_reference",
+            e,
+            chat_id=chat_id,
+            sticker_set=sticker_set,
+            emoji=emoji,
+            document_id=document_id,
+        )
+
+
 @mcp.tool()
 async def send_sticker(chat_id: int, file_path: str) -> str:
     """
@@ -2176,23 +3191,41 @@ async def send_sticker(chat_id: int, file_path: str) -> str:
         file_path: Absolute path to the .webp sticker file.
     """
     try:
-        if not os.path.isfile(file_path):
-            return f"Sticker file not found: {file_path}"
-        if not os.access(file_path, os.R_OK):
-            return f"Sticker file is not readable: {file_path}"
+        error = await check_readable_file(file_path, "Sticker file")
+        if error:
+            return error
         if not file_path.lower().endswith(".webp"):
             return "Sticker file must be a .webp file."
         entity = await client.get_entity(chat_id)
-        await client.send_file(entity, file_path, force_document=False)
+        await send_file_cached(entity, file_path, kind="sticker", force_document=False)
         return f"Sticker sent to chat {chat_id}."
     except Exception as e:
         return log_and_format_error("send_sticker", e, chat_id=chat_id, file_path=file_path)
 
 
+# GIF search results, so send_gif can send by id without another lookup or upload.
+# File references expire, hence the TTL.
+GIF_CACHE_TTL = float(os.getenv("GIF_CACHE_TTL", "3600"))
+gif_cache: Dict[int, tuple] = {}
+
+
+def remember_gifs(documents: list) -> List[int]:
+    """Cache the InputDocument (id, access hash, file reference) of each GIF; return ids."""
+    now = time.monotonic()
+    for gif_id in [k for k, (stamp, _) in gif_cache.items() if now - stamp > GIF_CACHE_TTL]:
+        del gif_cache[gif_id]
+    ids = []
+    for document in documents:
+        gif_cache[document.id] = (now, utils.get_input_document(document))
+        ids.append(document.id)
+    return ids
+
+
 @mcp.tool()
 async def get_gif_search(query: str, limit: int = 10) -> str:
     """
     Search for GIFs by query. Returns a list of Telegram document IDs (not file paths).
+    Results are cached so that send_gif can send them directly.
     Args:
         query: Search term for GIFs.
         limit: Max number of GIFs to return.
@@ -2205,9 +3238,7 @@ async def get_gif_search(query: str, limit: int = 10) -> str:
             )
             if not result.gifs:
                 return "[]"
-            return json.dumps(
-                [g.document.id for g in result.gifs], indent=2, default=json_serializer
-            )
+            return serialization.dumps(remember_gifs([g.document for g in result.gifs]))
         except (AttributeError, ImportError):
             # Fallback approach: Use SearchRequest with GIF filter
             try:
@@ -2231,11 +3262,11 @@ async def get_gif_search(query: str, limit: int = 10) -> str:
                 if not result or not hasattr(result, "messages") or not result.messages:
                     return "[]"
                 # Extract document IDs from any messages with media
-                gif_ids = []
+                documents = []
                 for msg in result.messages:
                     if hasattr(msg, "media") and msg.media and hasattr(msg.media, "document"):
-                        gif_ids.append(msg.media.document.id)
-                return json.dumps(gif_ids, default=json_serializer)
+                        documents.append(msg.media.document)
+                return serialization.dumps(remember_gifs(documents))
             except Exception as inner_e:
                 # Last resort: Try to fetch from a public bot
                 return f"Could not search GIFs using available methods: {inner_e}"
@@ -2247,7 +3278,8 @@ async def get_gif_search(query: str, limit: int = 10) -> str:
 @mcp.tool()
 async def send_gif(chat_id: int, gif_id: int) -> str:
     """
-    Send a GIF to a chat by Telegram GIF document ID (not a file path).
+    Send a GIF to a chat by Telegram GIF document ID (not a file path). The GIF is sent
+    from the get_gif_search cache, without re-uploading it.
     Args:
         chat_id: The chat ID.
         gif_id: Telegram document ID for the GIF (from get_gif_search).
@@ -2255,8 +3287,12 @@ async def send_gif(chat_id: int, gif_id: int) -> str:
     try:
         if not isinstance(gif_id, int):
             return "gif_id must be a Telegram document ID (integer), not a file path. Use get_gif_search to find IDs."
+        stamp, document = gif_cache.get(gif_id, (None, None))
+        if document is None or time.monotonic() - stamp > GIF_CACHE_TTL:
+            gif_cache.pop(gif_id, None)
+            return f"GIF {gif_id} is not in the search cache or has expired. Run get_gif_search again."
         entity = await client.get_entity(chat_id)
-        await client.send_file(entity, gif_id)
+        await client.send_file(entity, document)
         return f"GIF sent to chat {chat_id}."
     except Exception as e:
         return log_and_format_error("send_gif", e, chat_id=chat_id, gif_id=gif_id)
@@ -2276,8 +3312,8 @@ async def get_bot_info(bot_username: str) -> str:
 
         # Create a more structured, serializable response
         if hasattr(result, "to_dict"):
-            # Use custom serializer to handle non-serializable types
-            return json.dumps(result.to_dict(), indent=2, default=json_serializer)
+            # datetimes and bytes in the TL dict are encoded by the serializer
+            return serialization.dumps(result.to_dict())
         else:
             # Fallback if to_dict is not available
             info = {
@@ -2401,8 +3437,8 @@ async def get_recent_actions(chat_id: int) -> str:
         if not result or not result.events:
             return "No recent admin actions found."
 
-        # Use the custom serializer to handle datetime objects
-        return json.dumps([e.to_dict() for e in result.events], indent=2, default=json_serializer)
+        # datetimes and bytes in the TL dicts are encoded by the serializer
+        return serialization.dumps([e.to_dict() for e in result.events])
     except Exception as e:
         logger.exception(f"get_recent_actions failed (chat_id={chat_id})")
         return log_and_format_error("get_recent_actions", e, chat_id=chat_id)
@@ -2437,14 +3473,28 @@ async def get_pinned_messages(chat_id: int) -> str:
         return log_and_format_error("get_pinned_messages", e, chat_id=chat_id)
 
 
+@mcp.tool()
+async def get_rpc_scheduler_stats() -> str:
+    """
+    Get per-method-family RPC statistics: calls, time spent queued for rate limits, flood
+    waits absorbed and current queue depth, plus how many callers each coalesced read RPC
+    served.
+    """
+    try:
+        return serialization.dumps(client.scheduler.snapshot())
+    except Exception as e:
+        return log_and_format_error("get_rpc_scheduler_stats", e)
+
+
 if __name__ == "__main__":
-    nest_asyncio.apply()
+    # Telethon and the stdio server both run on the loop created by asyncio.run below
 
     async def main() -> None:
         try:
             # Start the Telethon client non-interactively
             print("Starting Telegram client...")
             await client.start()
+            broadcast_queue.resume()
 
             print("Telegram client started. Running MCP server...")
             # Use the asynchronous entrypoint instead of mcp.run()
@@ -0,0 +1,684 @@
+"""
+Parallel media transfers for the Telegram client.
+
+Large files are split into fixed-size parts that are fetched or uploaded concurrently over
+several dedicated MTProto connections instead of one part at a time over the main sender.
+Every part request still goes through the client's `_call`, so it is rate limited by the RPC
+scheduler. `UploadCache` remembers what was already uploaded or sent, keyed by content hash,
+so repeat sends of the same bytes reuse the server-side file, and `MediaCache` keeps
+downloaded media on disk so repeat downloads need no network I/O.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import shutil
+import hashlib
+import asyncio
+import logging
+import threading
+import collections
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from telethon import functions, types
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+
+logger = logging.getLogger("telegram_mcp.media")
+
+# Largest part upload.getFile accepts; keeping offsets 1 MiB aligned satisfies its rules
+PART_SIZE = 1024 * 1024
+# Largest part upload.saveFilePart/saveBigFilePart accept
+UPLOAD_PART_SIZE = 512 * 1024
+# Files above this size must be uploaded as "big" files
+BIG_FILE_SIZE = 10 * 1024 * 1024
+DOWNLOAD_CONNECTIONS = int(os.getenv("MEDIA_DOWNLOAD_CONNECTIONS", "4"))
+UPLOAD_CONNECTIONS = int(os.getenv("MEDIA_UPLOAD_CONNECTIONS", "4"))
+# Smaller files are left to Telethon's single-sender download
+PARALLEL_MIN_SIZE = int(os.getenv("MEDIA_PARALLEL_MIN_SIZE", str(10 * 1024 * 1024)))
+# Buffer size for streamed writes; bounds how much data each write call hands to the OS
+WRITE_BUFFER_SIZE = 1024 * 1024
+# How often the resume sidecar is rewritten while a download is running
+STATE_FLUSH_SECONDS = 1.0
+# Uploaded (but unsent) file parts are only kept by Telegram for a limited time
+UPLOAD_CACHE_TTL = float(os.getenv("UPLOAD_CACHE_TTL", "3600"))
+
+# Transfers currently running, keyed by destination path
+active_transfers: Dict[str, Dict[str, Any]] = {}
+
+
+class UnsupportedTransfer(Exception):
+    """The media cannot be fetched by the parallel engine; use the regular download."""
+
+
+async def _get_transfer_dc(client, dc_id: int):
+    """Prefer the media-only address of a DC, which Telegram provides for bulk file traffic."""
+    dc = await client._get_dc(dc_id)
+    for option in client._config.dc_options:
+        if (
+            option.id == dc_id
+            and option.media_only
+            and not option.cdn
+            and bool(option.ipv6) == client._use_ipv6
+        ):
+            return option
+    return dc
+
+
+async def open_senders(client, dc_id: int, count: int) -> List[MTProtoSender]:
+    """
+    Open `count` extra connections to `dc_id`. The home DC reuses the session's auth key;
+    other DCs import an exported authorization once and share the resulting key.
+    """
+    dc = await _get_transfer_dc(client, dc_id)
+    auth_key = client.session.auth_key if dc_id == client.session.dc_id else None
+    senders = []
+    try:
+        for _ in range(count):
+            sender = MTProtoSender(auth_key, loggers=client._log)
+            await sender.connect(
+                client._connection(
+                    dc.ip_address,
+                    dc.port,
+                    dc.id,
+                    loggers=client._log,
+                    proxy=client._proxy,
+                    local_addr=client._local_addr,
+                )
+            )
+            if auth_key is None:
+                auth = await client(functions.auth.ExportAuthorizationRequest(dc_id))
+                client._init_request.query = functions.auth.ImportAuthorizationRequest(
+                    id=auth.id, bytes=auth.bytes
+                )
+                await sender.send(functions.InvokeWithLayerRequest(LAYER, client._init_request))
+                auth_key = sender.auth_key
+            senders.append(sender)
+    except BaseException:
+        await close_senders(senders)
+        raise
+    return senders
+
+
+async def close_senders(senders: List[MTProtoSender]) -> None:
+    await asyncio.gather(*[s.disconnect() for s in senders], return_exceptions=True)
+
+
+class _PositionalFile:
+    """Reads and writes blocks at absolute offsets of an open file, from worker threads."""
+
+    def __init__(self, path: str, writable: bool = True):
+        flags = (os.O_RDWR | os.O_CREAT) if writable else os.O_RDONLY
+        self.fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o644)
+        self._lock = threading.Lock()
+
+    def preallocate(self, size: int) -> None:
+        if os.fstat(self.fd).st_size != size:
+            os.ftruncate(self.fd, size)
+
+    def write_at(self, offset: int, data: bytes) -> None:
+        if hasattr(os, "pwrite"):
+            os.pwrite(self.fd, data, offset)
+            return
+        with self._lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            os.write(self.fd, data)
+
+    def read_at(self, offset: int, length: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self.fd, length, offset)
+        with self._lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            return os.read(self.fd, length)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _load_state(state_path: str, key: str, part_path: str, size: int) -> set:
+    """Return the parts already on disk from a previous attempt at the same file."""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        if (
+            state.get("key") == key
+            and state.get("part_size") == PART_SIZE
+            and os.path.getsize(part_path) == size
+        ):
+            return set(state.get("done", []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+
+def _save_state(state_path: str, key: str, size: int, done: set) -> None:
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"key": key, "size": size, "part_size": PART_SIZE, "done": sorted(done)}, f)
+    os.replace(tmp_path, state_path)
+
+
+class ParallelDownloader:
+    """
+    Downloads large documents with several connections at once.
+
+    Parts are written in place into a preallocated `<path>.part` file. A `<path>.part.json`
+    sidecar records finished parts, so an interrupted download resumes where it stopped.
+    """
+
+    def __init__(self, client, connections: int = DOWNLOAD_CONNECTIONS):
+        self.client = client
+        self.connections = max(1, connections)
+
+    @staticmethod
+    def supports(media) -> bool:
+        document = getattr(media, "document", None)
+        return isinstance(document, types.Document) and (document.size or 0) >= PARALLEL_MIN_SIZE
+
+    async def download(self, document: types.Document, path: str) -> Dict[str, Any]:
+        """Download `document` to `path` and return size, timing and throughput."""
+        if not isinstance(document, types.Document) or not document.size:
+            raise UnsupportedTransfer("only sized documents can be downloaded in parallel")
+
+        size = document.size
+        location = types.InputDocumentFileLocation(
+            id=document.id,
+            access_hash=document.access_hash,
+            file_reference=document.file_reference,
+            thumb_size="",
+        )
+        key = f"{document.dc_id}:{document.id}:{size}"
+        part_path = path + ".part"
+        state_path = part_path + ".json"
+        part_count = (size + PART_SIZE - 1) // PART_SIZE
+
+        done = await asyncio.to_thread(_load_state, state_path, key, part_path, size)
+        pending = collections.deque(i for i in range(part_count) if i not in done)
+        resumed_bytes = sum(min(PART_SIZE, size - i * PART_SIZE) for i in done)
+        progress = {
+            "path": path,
+            "size": size,
+            "transferred": resumed_bytes,
+            "resumed_bytes": resumed_bytes,
+            "direction": "download",
+            "connections": min(self.connections, max(1, len(pending))),
+            "started_at": time.time(),
+        }
+        active_transfers[path] = progress
+
+        writer = await asyncio.to_thread(_PositionalFile, part_path)
+        senders = []
+        last_flush = [time.monotonic()]
+        unsupported = False
+        try:
+            await asyncio.to_thread(writer.preallocate, size)
+            if pending:
+                senders = await open_senders(self.client, document.dc_id, progress["connections"])
+
+            async def worker(sender):
+                while pending:
+                    index = pending.popleft()
+                    offset = index * PART_SIZE
+                    result = await self.client._call(
+                        sender,
+                        functions.upload.GetFileRequest(
+                            location=location, offset=offset, limit=PART_SIZE
+                        ),
+                    )
+                    if isinstance(result, types.upload.FileCdnRedirect):
+                        raise UnsupportedTransfer("file is served from a CDN")
+                    await asyncio.to_thread(writer.write_at, offset, result.bytes)
+                    done.add(index)
+                    progress["transferred"] += len(result.bytes)
+                    if time.monotonic() - last_flush[0] >= STATE_FLUSH_SECONDS:
+                        last_flush[0] = time.monotonic()
+                        await asyncio.to_thread(_save_state, state_path, key, size, set(done))
+
+            tasks = [asyncio.ensure_future(worker(s)) for s in senders]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        except UnsupportedTransfer:
+            # The caller downloads it another way; nothing here can be resumed
+            unsupported = True
+            raise
+        except BaseException:
+            await asyncio.to_thread(_save_state, state_path, key, size, done)
+            raise
+        finally:
+            await close_senders(senders)
+            await asyncio.to_thread(writer.close)
+            active_transfers.pop(path, None)
+            if unsupported:
+                await asyncio.to_thread(_remove_quietly, part_path)
+                await asyncio.to_thread(_remove_quietly, state_path)
+
+        await asyncio.to_thread(os.replace, part_path, path)
+        await asyncio.to_thread(_remove_quietly, state_path)
+
+        seconds = time.time() - progress["started_at"]
+        fetched = size - resumed_bytes
+        return {
+            "path": path,
+            "size": size,
+            "resumed_bytes": resumed_bytes,
+            "connections": progress["connections"],
+            "seconds": round(seconds, 2),
+            "mb_per_second": round(fetched / seconds / 1e6, 2) if seconds > 0 else None,
+        }
+
+
+class ParallelUploader:
+    """Uploads large files as parts sent concurrently over several connections to the home DC."""
+
+    def __init__(self, client, connections: int = UPLOAD_CONNECTIONS):
+        self.client = client
+        self.connections = max(1, connections)
+
+    async def upload(self, path: str) -> Union[types.InputFile, types.InputFileBig]:
+        size = await asyncio.to_thread(os.path.getsize, path)
+        if size < PARALLEL_MIN_SIZE:
+            # Small enough to hold in memory; reading it here keeps the disk I/O that
+            # Telethon would otherwise do on the event loop in a worker thread.
+            data = await asyncio.to_thread(_read_file, path)
+            return await self.client.upload_file(data, file_name=os.path.basename(path))
+
+        part_count = (size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE
+        file_id = random.getrandbits(63)
+        is_big = size > BIG_FILE_SIZE
+        pending = collections.deque(range(part_count))
+        progress = {
+            "path": path,
+            "size": size,
+            "transferred": 0,
+            "resumed_bytes": 0,
+            "direction": "upload",
+            "connections": min(self.connections, part_count),
+            "started_at": time.time(),
+        }
+        active_transfers[path] = progress
+
+        reader = await asyncio.to_thread(_PositionalFile, path, False)
+        senders = []
+        try:
+            senders = await open_senders(
+                self.client, self.client.session.dc_id, progress["connections"]
+            )
+
+            async def worker(sender):
+                while pending:
+                    index = pending.popleft()
+                    # Each worker holds at most one part in memory
+                    data = await asyncio.to_thread(
+                        reader.read_at, index * UPLOAD_PART_SIZE, UPLOAD_PART_SIZE
+                    )
+                    if is_big:
+                        request = functions.upload.SaveBigFilePartRequest(
+                            file_id, index, part_count, data
+                        )
+                    else:
+                        request = functions.upload.SaveFilePartRequest(file_id, index, data)
+                    if not await self.client._call(sender, request):
+                        raise RuntimeError(f"Telegram rejected part {index} of {path}")
+                    progress["transferred"] += len(data)
+
+            tasks = [asyncio.ensure_future(worker(s)) for s in senders]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        finally:
+            await close_senders(senders)
+            await asyncio.to_thread(reader.close)
+            active_transfers.pop(path, None)
+
+        name = os.path.basename(path)
+        if is_big:
+            return types.InputFileBig(file_id, part_count, name)
+        return types.InputFile(file_id, part_count, name, "")
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, read in bounded blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_PART_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """
+    Content-addressed memory of uploads.
+
+    Uploaded `InputFile`s are kept in memory for UPLOAD_CACHE_TTL seconds, because Telegram
+    discards unsent parts after a while. Once a file has been sent, the resulting document or
+    photo reference is persisted in SQLite and reused directly by later sends. Entries are keyed
+    by content hash and by `kind`, since e.g. a voice note and a plain file with the same bytes
+    are different media.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._db = None
+        self._files: Dict[str, Tuple[float, Any]] = {}
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sent_media (
+                    digest TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    media_id INTEGER NOT NULL,
+                    access_hash INTEGER NOT NULL,
+                    file_reference BLOB NOT NULL,
+                    PRIMARY KEY (digest, kind)
+                )
+                """)
+        return self._db
+
+    async def digest(self, path: str) -> str:
+        """Content hash of `path`, memoised by (path, size, mtime) to avoid re-reading."""
+        stat = await asyncio.to_thread(os.stat, path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = await asyncio.to_thread(file_digest, path)
+        return self._digests[key]
+
+    def get_file(self, digest: str):
+        entry = self._files.get(digest)
+        if entry and time.monotonic() - entry[0] < UPLOAD_CACHE_TTL:
+            return entry[1]
+        self._files.pop(digest, None)
+        return None
+
+    def put_file(self, digest: str, input_file) -> None:
+        self._files[digest] = (time.monotonic(), input_file)
+
+    def get_media(self, digest: str, kind: str):
+        row = self.db.execute(
+            "SELECT media_type, media_id, access_hash, file_reference FROM sent_media "
+            "WHERE digest = ? AND kind = ?",
+            (digest, kind),
+        ).fetchone()
+        if row is None:
+            return None
+        media_type, media_id, access_hash, file_reference = row
+        cls = types.InputPhoto if media_type == "photo" else types.InputDocument
+        return cls(id=media_id, access_hash=access_hash, file_reference=bytes(file_reference))
+
+    def put_media(self, digest: str, kind: str, message) -> None:
+        """Remember the document or photo that `message` carries for later reuse."""
+        media = getattr(message, "media", None)
+        if isinstance(media, types.MessageMediaDocument) and media.document:
+            media_type, item = "document", media.document
+        elif isinstance(media, types.MessageMediaPhoto) and media.photo:
+            media_type, item = "photo", media.photo
+        else:
+            return
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sent_media VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, kind, media_type, item.id, item.access_hash, item.file_reference),
+            )
+
+    def forget_media(self, digest: str, kind: str) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM sent_media WHERE digest = ? AND kind = ?", (digest, kind))
+
+
+class MediaCache:
+    """
+    On-disk cache of downloaded media, keyed by Telegram document/photo id and size variant.
+
+    Files are evicted least-recently-used first (by mtime, refreshed on every hit) once the
+    directory exceeds `max_bytes`. Files enter and leave the cache as independent copies
+    (a reflink where the filesystem supports it), so editing a downloaded file can never
+    change the cached one, and refreshing a cache entry never touches the user's file.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(media, variant: str = "full") -> Optional[str]:
+        """Cache key for the media of a message, or None if it is not a file."""
+        document = getattr(media, "document", None)
+        if isinstance(document, types.Document):
+            return f"doc-{document.id}-{variant}"
+        photo = getattr(media, "photo", None)
+        if isinstance(photo, types.Photo):
+            return f"photo-{photo.id}-{variant}"
+        return None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _fetch(self, key: str, target: str) -> bool:
+        cached = self._path(key)
+        if not os.path.isfile(cached):
+            return False
+        os.utime(cached)
+        _remove_quietly(target)
+        _clone_file(cached, target)
+        return True
+
+    def _store(self, key: str, source: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        cached = self._path(key)
+        tmp_path = cached + ".tmp"
+        _remove_quietly(tmp_path)
+        _clone_file(source, tmp_path)
+        os.replace(tmp_path, cached)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove_quietly(path)
+            total -= size
+
+    async def fetch(self, key: Optional[str], target: str) -> bool:
+        """Place the cached file for `key` at `target`; False on a miss."""
+        if not key or not self.enabled:
+            return False
+        return await asyncio.to_thread(self._fetch, key, target)
+
+    async def store(self, key: Optional[str], source: str) -> None:
+        """Add a freshly downloaded file to the cache and trim it to its size budget."""
+        if not key or not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._store, key, source)
+        except OSError as e:
+            logger.warning(f"Could not cache {source}: {e}")
+
+
+def _describe_sizes(sizes) -> List[Dict[str, Any]]:
+    result = []
+    for size in sizes or []:
+        entry = {"type": getattr(size, "type", None)}
+        if getattr(size, "w", None):
+            entry["width"], entry["height"] = size.w, size.h
+        if isinstance(size, types.PhotoSizeProgressive):
+            entry["size"] = max(size.sizes)
+        elif isinstance(size, (types.PhotoCachedSize, types.PhotoStrippedSize)):
+            entry["size"] = len(size.bytes)
+            entry["inline"] = True
+        elif getattr(size, "size", None) is not None:
+            entry["size"] = size.size
+        result.append(entry)
+    return result
+
+
+def describe_media(media) -> Dict[str, Any]:
+    """Compact, JSON-serializable description of a message's media."""
+    info: Dict[str, Any] = {"type": type(media).__name__}
+    document = getattr(media, "document", None)
+    photo = getattr(media, "photo", None)
+    if isinstance(document, types.Document):
+        info.update(
+            {
+                "kind": "document",
+                "id": document.id,
+                "dc_id": document.dc_id,
+                "mime_type": document.mime_type,
+                "size": document.size,
+                "thumbnails": _describe_sizes(document.thumbs),
+            }
+        )
+        for attr in document.attributes:
+            if isinstance(attr, types.DocumentAttributeFilename):
+                info["file_name"] = attr.file_name
+            elif isinstance(
+                attr, (types.DocumentAttributeImageSize, types.DocumentAttributeVideo)
+            ):
+                info["width"], info["height"] = attr.w, attr.h
+                if isinstance(attr, types.DocumentAttributeVideo):
+                    info["kind"] = "round_video" if attr.round_message else "video"
+                    info["duration"] = attr.duration
+            elif isinstance(attr, types.DocumentAttributeAudio):
+                info["kind"] = "voice" if attr.voice else "audio"
+                info["duration"] = attr.duration
+                if attr.title:
+                    info["title"] = attr.title
+                if attr.performer:
+                    info["performer"] = attr.performer
+            elif isinstance(attr, types.DocumentAttributeSticker):
+                info["kind"] = "sticker"
+                info["emoji"] = attr.alt
+            elif isinstance(attr, types.DocumentAttributeAnimated):
+                info["kind"] = "animation"
+    elif isinstance(photo, types.Photo):
+        sizes = _describe_sizes(photo.sizes)
+        info.update({"kind": "photo", "id": photo.id, "dc_id": photo.dc_id, "sizes": sizes})
+        largest = max(
+            (s for s in sizes if "width" in s),
+            key=lambda s: s["width"] * s["height"],
+            default=None,
+        )
+        if largest:
+            info["width"], info["height"] = largest["width"], largest["height"]
+            info["size"] = largest.get("size")
+    elif isinstance(media, types.MessageMediaWebPage) and isinstance(media.webpage, types.WebPage):
+        info.update({"kind": "webpage", "url": media.webpage.url, "title": media.webpage.title})
+    elif isinstance(media, types.MessageMediaGeo) and isinstance(media.geo, types.GeoPoint):
+        info.update({"kind": "geo", "lat": media.geo.lat, "long": media.geo.long})
+    elif isinstance(media, types.MessageMediaContact):
+        info.update(
+            {
+                "kind": "contact",
+                "phone": media.phone_number,
+                "name": f"{media.first_name} {media.last_name}".strip(),
+            }
+        )
+    return info
+
+
+async def stream_download(
+    client, media, path: str, offset: int = 0, length: Optional[int] = None
+) -> int:
+    """
+    Stream a media file (or `length` bytes of it starting at `offset`) to `path` over the
+    main connection, fetching only the parts that cover the range. At most one part is held
+    in memory and every write happens in a worker thread, so the event loop never blocks on
+    the disk. The data lands in `<path>.part` and is renamed into place once complete.
+    Returns the number of bytes written.
+    """
+    written = 0
+    part_path = path + ".part"
+    handle = await asyncio.to_thread(open, part_path, "wb", WRITE_BUFFER_SIZE)
+    stream = client.iter_download(media, offset=offset, request_size=PART_SIZE)
+    try:
+        async for chunk in stream:
+            if length is not None:
+                chunk = chunk[: length - written]
+            await asyncio.to_thread(handle.write, chunk)
+            written += len(chunk)
+            if length is not None and written >= length:
+                break
+    except BaseException:
+        await asyncio.to_thread(handle.close)
+        await asyncio.to_thread(_remove_quietly, part_path)
+        raise
+    finally:
+        await stream.close()
+    await asyncio.to_thread(handle.close)
+    await asyncio.to_thread(os.replace, part_path, path)
+    return written
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ioctl that makes `dst` share `src`'s extents copy-on-write (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+
+def _clone_file(src: str, dst: str) -> None:
+    """Copy `src` to `dst` as a reflink when the filesystem supports it, else byte for byte."""
+    if fcntl is not None:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def transfer_progress() -> List[Dict[str, Any]]:
+    """Snapshot of running transfers with percentage and current throughput."""
+    now = time.time()
+    result = []
+    for progress in active_transfers.values():
+        elapsed = now - progress["started_at"]
+        moved = progress["transferred"] - progress["resumed_bytes"]
+        result.append(
+            {
+                **progress,
+                "percent": round(100.0 * progress["transferred"] / progress["size"], 1),
+                "mb_per_second": round(moved / elapsed / 1e6, 2) if elapsed > 0 else None,
+            }
+        )
+    return result
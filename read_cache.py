@@ -0,0 +1,192 @@
+"""
+Cached JSON views behind the REST read endpoints.
+
+A view (the dialog list, the recent messages of a chat, a chat's info) is built once, encoded
+and kept with a strong ETag until a Telegram update touching its chat invalidates it or
+READ_CACHE_TTL seconds pass. Polling an unchanged view therefore costs no RPCs, and a client
+sending If-None-Match gets a 304 without a body. Concurrent requests for a view that is being
+built share that one build. Views are scoped by marked peer id; the dialog list (scope None)
+is invalidated together with every chat.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from telethon import types, utils
+
+import serialization
+
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "300"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "500"))
+
+# Updates whose chat is identified by a channel id
+_CHANNEL_UPDATES = (
+    types.UpdateDeleteChannelMessages,
+    types.UpdateReadChannelInbox,
+    types.UpdateChannel,
+    types.UpdateChannelTooLong,
+)
+# Updates that name no chat, so every view may be stale
+_UNSCOPED_UPDATES = (types.UpdateDeleteMessages, types.UpdateShortSentMessage)
+_DIALOG_UPDATES = (types.UpdateDialogPinned, types.UpdatePinnedDialogs)
+
+_ALL = object()
+_IGNORED = object()
+
+
+def affected_chat(update) -> Any:
+    """
+    Marked peer id of the chat an update changes: None if only the dialog list changes, _ALL
+    if the chat is unknown and _IGNORED if no view depends on the update.
+    """
+    if isinstance(
+        update,
+        (
+            types.UpdateNewMessage,
+            types.UpdateNewChannelMessage,
+            types.UpdateEditMessage,
+            types.UpdateEditChannelMessage,
+        ),
+    ):
+        peer = getattr(update.message, "peer_id", None)
+        return utils.get_peer_id(peer) if peer is not None else _ALL
+    if isinstance(update, types.UpdateShortMessage):
+        return update.user_id
+    if isinstance(update, types.UpdateShortChatMessage):
+        return utils.get_peer_id(types.PeerChat(update.chat_id))
+    if isinstance(update, _CHANNEL_UPDATES):
+        return utils.get_peer_id(types.PeerChannel(update.channel_id))
+    if isinstance(update, types.UpdateReadHistoryInbox):
+        return utils.get_peer_id(update.peer)
+    if isinstance(update, types.UpdateChatParticipants):
+        return utils.get_peer_id(types.PeerChat(update.participants.chat_id))
+    if isinstance(update, (types.UpdateChatParticipantAdd, types.UpdateChatParticipantDelete)):
+        return utils.get_peer_id(types.PeerChat(update.chat_id))
+    if isinstance(update, _UNSCOPED_UPDATES):
+        return _ALL
+    if isinstance(update, _DIALOG_UPDATES):
+        return None
+    return _IGNORED
+
+
+class CachedView:
+    __slots__ = ("body", "etag", "built_at")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.built_at = time.monotonic()
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value names this view's ETag."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+
+class ReadCache:
+    """Encoded views with ETags, invalidated per chat, with shared in-flight builds."""
+
+    def __init__(self, ttl: float = READ_CACHE_TTL, max_entries: int = READ_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedView]" = OrderedDict()
+        self._building: Dict[Hashable, asyncio.Future] = {}
+        self._scopes: Dict[Optional[int], Set[Hashable]] = {}
+        self._scope_of: Dict[Hashable, Optional[int]] = {}
+        self.stats = {"hits": 0, "builds": 0, "shared_builds": 0, "invalidations": 0}
+
+    async def get(
+        self, key: Hashable, scope: Optional[int], build: Callable[[], Awaitable[Any]]
+    ) -> CachedView:
+        """The cached view for `key`, built with `build()` if missing, expired or invalidated."""
+        view = self._entries.get(key)
+        if view is not None and time.monotonic() - view.built_at < self.ttl:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return view
+
+        pending = self._building.get(key)
+        if pending is not None:
+            self.stats["shared_builds"] += 1
+            return await asyncio.shield(pending)
+
+        # The build runs in its own task, so the caller that started it going away (e.g. a
+        # client disconnect) neither cancels it nor fails the callers sharing it
+        task = asyncio.ensure_future(self._build(build))
+        self._building[key] = task
+        self._scopes.setdefault(scope, set()).add(key)
+        self._scope_of[key] = scope
+        self.stats["builds"] += 1
+
+        def finished(done: asyncio.Future) -> None:
+            # Also marks the exception as retrieved if every caller went away
+            failed = done.cancelled() or done.exception() is not None
+            # An invalidation during the build removed the marker; don't keep a stale view
+            if self._building.get(key) is not done:
+                return
+            del self._building[key]
+            if failed:
+                self._forget(key)
+            else:
+                self._store(key, done.result())
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _build(build: Callable[[], Awaitable[Any]]) -> CachedView:
+        return CachedView(serialization.dumps_bytes(await build()))
+
+    def _store(self, key: Hashable, view: CachedView) -> None:
+        self._entries[key] = view
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old, _ = self._entries.popitem(last=False)
+            self._forget(old)
+
+    def _forget(self, key: Hashable) -> None:
+        scope = self._scope_of.pop(key, None)
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    def invalidate_chat(self, chat_id: Optional[int]) -> None:
+        """Drop the views of one chat and the dialog list (chat_id None: the dialog list only)."""
+        keys = self._scopes.pop(None, set())
+        if chat_id is not None:
+            keys |= self._scopes.pop(chat_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+            self._building.pop(key, None)
+            self._scope_of.pop(key, None)
+        if keys:
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        if self._entries or self._building:
+            self.stats["invalidations"] += 1
+        self._entries.clear()
+        self._building.clear()
+        self._scopes.clear()
+        self._scope_of.clear()
+
+    def apply_update(self, update) -> None:
+        """Invalidate whatever a raw Telegram update may have changed."""
+        if not self._scopes:
+            return
+        chat = affected_chat(update)
+        if chat is _ALL:
+            self.clear()
+        elif chat is not _IGNORED:
+            self.invalidate_chat(chat)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "building": len(self._building)}
@@ -0,0 +1,244 @@
+"""
+Routing rules for monitored groups.
+
+Rules are loaded from a JSON file (ROUTING_CONFIG_PATH) or default to the single SATYA
+public group. Each group lists its workflows in priority order, and each workflow has
+triggers:
+
+    {"type": "keyword", "value": "satya"}        case-insensitive substring
+    {"type": "mention", "value": "satya_agent"}  "@satya_agent" anywhere in the text
+    {"type": "regex", "value": "\\bsat(ya)?\\b"}  case-insensitive regular expression
+    {"type": "reply"}                            the message replies to one of ours
+
+All keyword and mention triggers of a group are compiled into one Aho-Corasick automaton and
+its regex triggers into one alternation (regexes with groups or global inline flags are kept
+separate), so a message is classified in a single pass over its text regardless of how many
+rules the group has.
+
+Routed messages carry the sender username and chat title only when Telegram included them in
+the update or they are cached; set "resolve_entities": true on a workflow to look up the
+missing ones (batched) before its events are sent.
+
+A workflow can also opt into webhook batching with "batch": {"max_events": 50,
+"max_latency_ms": 500}: its events are then posted together, at most max_events per request
+and at most max_latency_ms after the first one.
+"""
+
+import re
+import json
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger("telegram_mcp.routing")
+
+DEFAULT_ROUTING_CONFIG = {
+    "bot_username": "satya_agent",
+    "superuser_webhook": "/webhook/satya/superuser",
+    "groups": [
+        {
+            "chat_id": -1002536132364,
+            "workflows": [
+                {
+                    "name": "chatbot",
+                    "coalesce_seconds": 30,
+                    "triggers": [{"type": "mention", "value": "satya_agent"}, {"type": "reply"}],
+                },
+                {
+                    "name": "mentions",
+                    "coalesce_seconds": 60,
+                    "triggers": [{"type": "keyword", "value": "satya"}],
+                },
+            ],
+        }
+    ],
+}
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher that reports the values attached to matched patterns."""
+
+    def __init__(self, patterns: Dict[str, Set[int]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Set[int]] = [set()]
+        for pattern, values in patterns.items():
+            node = 0
+            for char in pattern:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                node = nxt
+            self.output[node] |= values
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+
+    def search(self, text: str, stop: Optional[int] = None) -> Set[int]:
+        """Values of every pattern found in `text`; returns early once `stop` is found."""
+        found: Set[int] = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+                if stop in found:
+                    break
+        return found
+
+
+def _embeddable(rx: str) -> bool:
+    """Whether `rx` still compiles inside a group (e.g. no global flags such as "(?i)")."""
+    try:
+        re.compile(f"(?:{rx})")
+    except re.error:
+        return False
+    return True
+
+
+class WorkflowRule:
+    __slots__ = (
+        "name",
+        "workflow_type",
+        "chat_id",
+        "coalesce_seconds",
+        "webhook",
+        "on_reply",
+        "resolve_entities",
+        "batch_max_events",
+        "batch_max_latency",
+    )
+
+    def __init__(self, chat_id: int, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.chat_id = chat_id
+        self.workflow_type = spec.get("workflow_type", f"group_{chat_id}_{self.name}")
+        self.coalesce_seconds = float(spec.get("coalesce_seconds", 30))
+        self.webhook = spec.get("webhook", f"/webhook/satya/group/{chat_id}/{self.name}")
+        self.on_reply = any(t["type"] == "reply" for t in spec.get("triggers", []))
+        self.resolve_entities = bool(spec.get("resolve_entities", False))
+        batch = spec.get("batch")
+        self.batch_max_events = int(batch.get("max_events", 50)) if batch else None
+        self.batch_max_latency = float(batch.get("max_latency_ms", 500)) / 1000 if batch else None
+
+
+class GroupRules:
+    """Workflows of one group (in priority order) and their compiled matchers."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.chat_id = int(spec["chat_id"])
+        self.workflows = [WorkflowRule(self.chat_id, w) for w in spec["workflows"]]
+        literals: Dict[str, Set[int]] = {}
+        regexes = []
+        for index, workflow in enumerate(spec["workflows"]):
+            for trigger in workflow.get("triggers", []):
+                kind = trigger["type"]
+                if kind == "keyword":
+                    literals.setdefault(trigger["value"].lower(), set()).add(index)
+                elif kind == "mention":
+                    mention = "@" + trigger["value"].lstrip("@").lower()
+                    literals.setdefault(mention, set()).add(index)
+                elif kind == "regex":
+                    regexes.append((index, trigger["value"]))
+                elif kind != "reply":
+                    raise ValueError(f"Unknown trigger type {kind!r} in group {self.chat_id}")
+        self.literals = AhoCorasick(literals) if literals else None
+        # Regexes are joined into one alternation when that cannot change their meaning;
+        # ones with groups (which may be referenced by number) or global inline flags are
+        # compiled on their own. Each alternative is a zero-width lookahead in priority
+        # order, so every position is tried and overlapping matches can't hide each other
+        combined = []
+        combined_indexes = []
+        self.separate_regexes = []
+        for index, rx in regexes:
+            try:
+                compiled = re.compile(rx, re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"Invalid regex trigger {rx!r} in group {self.chat_id}: {e}")
+            if compiled.groups or not _embeddable(rx):
+                self.separate_regexes.append((index, compiled))
+            else:
+                combined.append(f"(?=(?P<r{len(combined)}_{index}>{rx}))")
+                combined_indexes.append(index)
+        self.regex = re.compile("|".join(combined), re.IGNORECASE) if combined else None
+        # No combined regex can beat a match of the highest-priority one, so the scan stops
+        self.first_regex = min(combined_indexes, default=None)
+        self.reply_workflows = {i for i, w in enumerate(self.workflows) if w.on_reply}
+
+    def classify(self, text: str, is_reply_to_us: bool = False) -> Optional[WorkflowRule]:
+        """Highest-priority workflow triggered by a message, or None."""
+        matched = set(self.reply_workflows) if is_reply_to_us else set()
+        if 0 not in matched and text:
+            if self.literals is not None:
+                matched |= self.literals.search(text.lower(), stop=0)
+            if self.regex is not None and 0 not in matched:
+                for match in self.regex.finditer(text):
+                    matched.add(int(match.lastgroup.rsplit("_", 1)[1]))
+                    if min(matched) <= self.first_regex:
+                        break
+            for index, compiled in self.separate_regexes:
+                if (not matched or index < min(matched)) and compiled.search(text):
+                    matched.add(index)
+        return self.workflows[min(matched)] if matched else None
+
+
+class RoutingTable:
+    """Routing rules of every monitored group, looked up by chat id."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.bot_username = config.get("bot_username", "")
+        self.superuser_webhook = config.get("superuser_webhook", "/webhook/satya/superuser")
+        self.groups: Dict[int, GroupRules] = {}
+        for spec in config.get("groups", []):
+            group = GroupRules(spec)
+            self.groups[group.chat_id] = group
+        self._by_type = {w.workflow_type: w for w in self.workflows()}
+
+    def classify(
+        self, chat_id: int, text: str, is_reply_to_us: bool = False
+    ) -> Optional[WorkflowRule]:
+        group = self.groups.get(chat_id)
+        return group.classify(text, is_reply_to_us) if group else None
+
+    def workflows(self) -> List[WorkflowRule]:
+        return [w for group in self.groups.values() for w in group.workflows]
+
+    def workflow(self, workflow_type: str) -> Optional[WorkflowRule]:
+        return self._by_type.get(workflow_type)
+
+    def webhook_endpoints(self, base_url: str) -> Dict[str, str]:
+        """Webhook URL per workflow type; relative webhook paths are joined to `base_url`."""
+
+        def url(path: str) -> str:
+            return path if "://" in path else f"{base_url}{path}"
+
+        endpoints = {"superuser": url(self.superuser_webhook)}
+        for workflow in self.workflows():
+            endpoints[workflow.workflow_type] = url(workflow.webhook)
+        return endpoints
+
+
+def load_routing_table(path: Optional[str]) -> RoutingTable:
+    """Load routing rules from a JSON file, or the built-in SATYA defaults if none is set."""
+    if not path:
+        return RoutingTable(DEFAULT_ROUTING_CONFIG)
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    table = RoutingTable(config)
+    logger.info(f"Loaded routing rules for {len(table.groups)} groups from {path}")
+    return table
@@ -0,0 +1,315 @@
+"""
+Central scheduling for Telegram RPCs.
+
+Every request made by the client goes through `RpcScheduler.run`, which rate limits it with a
+token bucket for its method family, serves interactive calls before bulk work, and retries
+FloodWaitError transparently as long as the wait fits within a deadline. Identical read-only
+requests that are in flight at the same time share a single RPC (`RpcScheduler.coalesce`).
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextlib
+import contextvars
+import collections
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from telethon import TelegramClient, errors, utils
+
+logger = logging.getLogger("telegram_mcp.rpc")
+
+# Priority classes; lower values are served first
+INTERACTIVE = 0
+BULK = 1
+
+rpc_priority = contextvars.ContextVar("rpc_priority", default=INTERACTIVE)
+
+# Method families and their default (requests per second, burst) limits. Override with
+# environment variables such as RPC_RATE_SEND="2:5".
+FAMILY_LIMITS = {
+    "send": (5.0, 10),
+    "history": (10.0, 20),
+    "resolve": (5.0, 10),
+    "dialogs": (2.0, 4),
+    "upload": (50.0, 50),
+    "download": (50.0, 50),
+    "default": (10.0, 20),
+}
+
+FAMILY_BY_METHOD = {
+    "messages.SendMessageRequest": "send",
+    "messages.SendMediaRequest": "send",
+    "messages.SendMultiMediaRequest": "send",
+    "messages.ForwardMessagesRequest": "send",
+    "messages.GetHistoryRequest": "history",
+    "messages.SearchRequest": "history",
+    "messages.SearchGlobalRequest": "history",
+    "messages.GetMessagesRequest": "history",
+    "channels.GetMessagesRequest": "history",
+    "contacts.ResolveUsernameRequest": "resolve",
+    "contacts.SearchRequest": "resolve",
+    "users.GetUsersRequest": "resolve",
+    "users.GetFullUserRequest": "resolve",
+    "channels.GetChannelsRequest": "resolve",
+    "channels.GetFullChannelRequest": "resolve",
+    "messages.GetChatsRequest": "resolve",
+    "messages.GetFullChatRequest": "resolve",
+    "messages.GetDialogsRequest": "dialogs",
+    "messages.GetPeerDialogsRequest": "dialogs",
+    "upload.SaveFilePartRequest": "upload",
+    "upload.SaveBigFilePartRequest": "upload",
+    "upload.GetFileRequest": "download",
+    "upload.GetCdnFileRequest": "download",
+    "upload.GetWebFileRequest": "download",
+}
+
+# Read-only methods whose concurrent identical calls can share one in-flight RPC
+COALESCED_METHODS = {
+    "messages.GetDialogsRequest",
+    "messages.GetPeerDialogsRequest",
+    "messages.GetHistoryRequest",
+    "messages.GetMessagesRequest",
+    "channels.GetMessagesRequest",
+    "users.GetUsersRequest",
+    "users.GetFullUserRequest",
+    "channels.GetChannelsRequest",
+    "channels.GetFullChannelRequest",
+    "messages.GetChatsRequest",
+    "messages.GetFullChatRequest",
+    "contacts.ResolveUsernameRequest",
+    "contacts.GetContactsRequest",
+    "help.GetConfigRequest",
+}
+
+# How long a single call may spend waiting out flood limits before the error is surfaced
+FLOOD_WAIT_DEADLINE = float(os.getenv("RPC_FLOOD_WAIT_DEADLINE", "60"))
+
+
+def method_name(request) -> str:
+    """Return the TL method name of a request, e.g. 'messages.SendMessageRequest'."""
+    cls = type(request)
+    return f"{cls.__module__.rsplit('.', 1)[-1]}.{cls.__name__}"
+
+
+def method_family(request) -> str:
+    return FAMILY_BY_METHOD.get(method_name(request), "default")
+
+
+@contextlib.contextmanager
+def bulk_priority():
+    """Run the RPCs made inside this block (and tasks it spawns) at bulk priority."""
+    token = rpc_priority.set(BULK)
+    try:
+        yield
+    finally:
+        rpc_priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out tokens to waiters in priority order.
+
+    A flood wait pauses the whole bucket so that other callers of the same method family do
+    not walk into the same limit.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._pump = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: int = INTERACTIVE) -> float:
+        """Wait for a token and return how long the caller waited."""
+        started = time.monotonic()
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and self.paused_until <= started:
+            self.tokens -= 1
+            return 0.0
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._run_pump())
+        await future
+        return time.monotonic() - started
+
+    async def _run_pump(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+
+class RpcScheduler:
+    """Routes every RPC through per-family token buckets with flood wait handling."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None):
+        self.limits = dict(limits or FAMILY_LIMITS)
+        for family in self.limits:
+            override = os.getenv(f"RPC_RATE_{family.upper()}")
+            if override:
+                rate, _, burst = override.partition(":")
+                self.limits[family] = (float(rate), int(burst or max(1, float(rate))))
+        self.buckets = {
+            family: TokenBucket(rate, burst) for family, (rate, burst) in self.limits.items()
+        }
+        self.stats: Dict[str, Dict[str, float]] = {
+            family: {"calls": 0, "queued_seconds": 0.0, "flood_waits": 0, "flood_seconds": 0}
+            for family in self.limits
+        }
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._served: Dict[Hashable, int] = {}
+        self.coalesce_stats: Dict[str, Dict[str, int]] = collections.defaultdict(
+            lambda: {"rpcs": 0, "callers": 0, "max_callers_per_rpc": 0}
+        )
+        # (method, callers served) for the most recent RPCs that served more than one call
+        self.recent_coalesced = collections.deque(maxlen=50)
+
+    async def coalesce(self, key: Hashable, name: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `call` unless an identical call (same `key`) is already in flight, in which case
+        wait for and share its result. The shared RPC runs in its own task, so cancelling the
+        caller that started it does not fail the others.
+        """
+        stats = self.coalesce_stats[name]
+        stats["callers"] += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self._served[key] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+        self._served[key] = 1
+        stats["rpcs"] += 1
+
+        def finished(done: asyncio.Future) -> None:
+            self._inflight.pop(key, None)
+            served = self._served.pop(key, 1)
+            stats["max_callers_per_rpc"] = max(stats["max_callers_per_rpc"], served)
+            if served > 1:
+                self.recent_coalesced.append({"method": name, "callers": served})
+            if not done.cancelled():
+                done.exception()  # Mark as retrieved even if every caller went away
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
+
+    async def run(self, request, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Execute `call` for `request` once its family has capacity, retrying flood waits
+        until FLOOD_WAIT_DEADLINE is exhausted.
+        """
+        first = request[0] if utils.is_list_like(request) else request
+        family = method_family(first)
+        bucket = self.buckets[family]
+        stats = self.stats[family]
+        count = len(request) if utils.is_list_like(request) else 1
+        deadline = time.monotonic() + FLOOD_WAIT_DEADLINE
+        priority = rpc_priority.get()
+
+        while True:
+            for _ in range(count):
+                stats["queued_seconds"] += await bucket.acquire(priority)
+            stats["calls"] += 1
+            try:
+                return await call()
+            except (
+                errors.FloodWaitError,
+                errors.FloodPremiumWaitError,
+                errors.SlowModeWaitError,
+            ) as e:
+                stats["flood_waits"] += 1
+                wait = max(1, e.seconds)
+                # Slow mode is specific to one chat, so it must not stall the whole family
+                if not isinstance(e, errors.SlowModeWaitError):
+                    bucket.pause(wait)
+                if time.monotonic() + wait > deadline:
+                    raise
+                logger.warning(f"Flood wait of {wait}s on {method_name(first)}, retrying")
+                stats["flood_seconds"] += wait
+                await asyncio.sleep(wait)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        result = {}
+        for family, stats in self.stats.items():
+            bucket = self.buckets[family]
+            result[family] = {
+                **stats,
+                "queued_seconds": round(stats["queued_seconds"], 3),
+                "rate_per_second": bucket.rate,
+                "burst": bucket.burst,
+                "waiting": len(bucket._waiters),
+                "paused_for_seconds": max(0, round(bucket.paused_until - now, 1)),
+            }
+        result["coalescing"] = {
+            "methods": dict(self.coalesce_stats),
+            "in_flight": len(self._inflight),
+            "recent": list(self.recent_coalesced),
+        }
+        return result
+
+
+class ScheduledTelegramClient(TelegramClient):
+    """TelegramClient whose every request, on any sender, goes through an RpcScheduler."""
+
+    def __init__(self, *args, scheduler: RpcScheduler = None, **kwargs):
+        # Telethon's own flood sleeping is disabled so that waits are handled (and counted)
+        # by the scheduler, which also pauses the whole method family.
+        kwargs.setdefault("flood_sleep_threshold", 0)
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler or RpcScheduler()
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        parent = super()._call
+
+        def call():
+            return self.scheduler.run(
+                request,
+                lambda: parent(
+                    sender, request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold
+                ),
+            )
+
+        key = await self._coalesce_key(sender, request)
+        if key is None:
+            return await call()
+        return await self.scheduler.coalesce(key, method_name(request), call)
+
+    async def _coalesce_key(self, sender, request) -> Optional[Hashable]:
+        """Key identifying identical read requests on the same sender, or None."""
+        if utils.is_list_like(request) or method_name(request) not in COALESCED_METHODS:
+            return None
+        try:
+            # Resolving is idempotent; it turns entities into input peers so that the
+            # serialized request identifies the call.
+            await request.resolve(self, utils)
+            return id(sender), bytes(request)
+        except Exception:
+            return None
@@ -0,0 +1,64 @@
+"""
+JSON encoding for tool results, webhook bodies and stored records.
+
+`dumps` produces compact JSON unless `indent=True` asks for the 2-space form a human reads.
+orjson is used when it is installed (pip install orjson); it encodes datetimes natively and
+only calls back into Python for bytes. Without it the standard library encoder is used with
+the same output rules: datetimes as ISO 8601, bytes as UTF-8 text (invalid sequences
+replaced), non-ASCII characters left as is.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# Non-string dict keys are converted to strings, as the standard library does
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", errors="replace")
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any, indent: bool) -> str:
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_default)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Encode `obj` as UTF-8 JSON bytes (compact unless `indent`)."""
+    if orjson is not None:
+        options = _ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the standard library can still encode
+            pass
+    return _stdlib_dumps(obj, indent).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Encode `obj` as a JSON string (compact unless `indent`)."""
+    if orjson is not None:
+        return dumps_bytes(obj, indent).decode("utf-8")
+    return _stdlib_dumps(obj, indent)
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
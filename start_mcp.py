@@ -1,8 +1,19 @@
 import os, threading, asyncio, traceback, sys, uvicorn
-import json, aiohttp
+import logging
+import contextlib
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from main import client, mcp, send_message
-from telethon import events
+from main import client, mcp, send_message, broadcast_queue, sent_messages, STATE_DB_PATH
+from main import format_entity, format_message
+from telethon import events, functions, types, utils
+from telethon.errors import RPCError
+from starlette.responses import JSONResponse, Response
+from webhooks import WebhookBatcher, WebhookClient, WebhookOutbox
+from coalescing import CoalescingEngine
+from routing_rules import load_routing_table
+from dispatcher import Dispatcher
+from read_cache import ReadCache
+import serialization
 
 # ===============================================================================
 # SATYA PUBLIC GROUP ROUTING SYSTEM - FOCUSED IMPLEMENTATION
@@ -10,49 +21,75 @@ from telethon import events
 
 # Configuration from environment
 SUPER_USER_ID = int(os.getenv("SUPER_USER_TELEGRAM_ID", "0"))
-SATYA_GROUP_PUBLIC = -1002536132364  # Public group ID
-BOT_USERNAME = "satya_agent"  # Bot username (without @)
-
-# Burst coalescing settings
-DIRECT_COALESCE_SECONDS = 30  # Direct messages burst coalescing
-MENTIONS_COALESCE_SECONDS = 60  # Mentions burst coalescing
-
-# Burst tracking storage
-burst_tracker = {
-    "direct_messages": [],  # List of pending direct messages
-    "mentions": [],         # List of pending mentions
-    "last_direct_send": None,
-    "last_mention_send": None,
-    "direct_timer": None,
-    "mention_timer": None
-}
+
+# Monitored groups, their workflows and triggers (JSON file, defaults to the SATYA public
+# group: @satya_agent or a reply -> chatbot (30s bursts), "satya" -> mentions (60s bursts))
+ROUTING_CONFIG_PATH = os.getenv("ROUTING_CONFIG_PATH")
+routing_table = load_routing_table(ROUTING_CONFIG_PATH)
+BOT_USERNAME = routing_table.bot_username  # Bot username (without @)
+
+# Per-message router logging: every message at DEBUG, one in ROUTER_LOG_SAMPLE_EVERY at INFO
+ROUTER_LOG_LEVEL = os.getenv("ROUTER_LOG_LEVEL", "INFO").upper()
+ROUTER_LOG_SAMPLE_EVERY = max(1, int(os.getenv("ROUTER_LOG_SAMPLE_EVERY", "100")))
+router_log = logging.getLogger("satya.router")
+router_log.setLevel(ROUTER_LOG_LEVEL)
+router_log.propagate = False
+if not router_log.handlers:
+    _router_handler = logging.StreamHandler(sys.stdout)
+    _router_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    router_log.addHandler(_router_handler)
+
+# Coalesce bursts per (workflow, chat); set COALESCE_BY_SENDER=1 to also split by sender
+COALESCE_BY_SENDER = os.getenv("COALESCE_BY_SENDER", "0") == "1"
+
+# Sender/chat metadata by peer id, filled from the entities Telegram attaches to updates
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+entity_cache = OrderedDict()
+
+def remember_entity(entity):
+    """Cache the username and display title of a user, chat or channel"""
+    if entity is None:
+        return
+    peer_id = utils.get_peer_id(entity)
+    entity_cache[peer_id] = {
+        "username": getattr(entity, 'username', None),
+        "title": getattr(entity, 'title', None) or getattr(entity, 'first_name', None)
+    }
+    entity_cache.move_to_end(peer_id)
+    if len(entity_cache) > ENTITY_CACHE_SIZE:
+        entity_cache.popitem(last=False)
+
+def cached_entity(peer_id):
+    info = entity_cache.get(peer_id)
+    if info is not None:
+        entity_cache.move_to_end(peer_id)
+    return info
 
 async def capture_structured_message_data(event):
-    """Capture and structure message data for processing"""
+    """
+    Capture and structure message data for processing.
+    
+    Never goes to the network: sender and chat metadata come from the entities included in
+    the update or from the entity cache, and may be None until fill_entity_metadata runs.
+    """
     try:
-        # Get sender info safely
-        sender_username = None
-        if event.sender:
-            sender_username = getattr(event.sender, 'username', None)
-        
-        # Get chat info safely  
-        chat_title = None
-        if hasattr(event.chat, 'title'):
-            chat_title = event.chat.title
-        elif hasattr(event.chat, 'first_name'):
-            chat_title = event.chat.first_name
-            
+        # event.sender/event.chat only return entities already attached to the update
+        remember_entity(event.sender)
+        remember_entity(event.chat)
+        sender = cached_entity(event.sender_id) or {}
+        chat = cached_entity(event.chat_id) or {}
+        
         message_data = {
             "sender_id": event.sender_id,
             "chat_id": event.chat_id,
             "message_text": event.raw_text or "",
             "message_id": event.id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": event.message.date.isoformat(),
             "is_private": event.is_private,
             "is_group": event.is_group,
             "is_channel": event.is_channel,
-            "sender_username": sender_username,
-            "chat_title": chat_title,
+            "sender_username": sender.get("username"),
+            "chat_title": chat.get("title"),
             "has_media": bool(event.media)
         }
         
@@ -69,217 +106,119 @@ async def capture_structured_message_data(event):
             "error": str(e)
         }
 
+async def fill_entity_metadata(messages):
+    """
+    Fill sender_username/chat_title of messages whose entities are not cached, with one
+    batched lookup. Only used for workflows configured with resolve_entities.
+    """
+    missing = {
+        peer_id
+        for message_data in messages
+        for peer_id in (message_data.get("sender_id"), message_data.get("chat_id"))
+        if peer_id and cached_entity(peer_id) is None
+    }
+    if missing:
+        try:
+            for entity in await client.get_entity(list(missing)):
+                remember_entity(entity)
+        except Exception as e:
+            print(f"[WARN] Entity lookup for {len(missing)} peers failed: {e}")
+    for message_data in messages:
+        sender = cached_entity(message_data.get("sender_id")) or {}
+        chat = cached_entity(message_data.get("chat_id")) or {}
+        message_data["sender_username"] = message_data.get("sender_username") or sender.get("username")
+        message_data["chat_title"] = message_data.get("chat_title") or chat.get("title")
+
 # ===============================================================================
 # PUBLIC GROUP MESSAGE DETECTION FUNCTIONS
 # ===============================================================================
 
 def is_from_public_group(event):
-    """Check if message is from the monitored public group"""
-    return event.chat_id == SATYA_GROUP_PUBLIC
+    """Check if message is from one of the monitored groups"""
+    return event.chat_id in routing_table.groups
 
 def is_superuser_message(event):
     """Check if message is from superuser (always priority)"""
     return event.sender_id == SUPER_USER_ID
 
-def is_direct_to_satya(event, message_data):
-    """
-    Check if message is direct to SATYA:
-    - Contains @satya_agent
-    - Is a reply to SATYA's messages
-    """
-    try:
-        text = message_data["message_text"].lower()
-        
-        # Check for @satya_agent mention
-        if f"@{BOT_USERNAME.lower()}" in text:
-            print(f"[DIRECT] @{BOT_USERNAME} mention detected from {event.sender_id}")
-            return True
-            
-        # Check if it's a reply to SATYA's message
-        if hasattr(event.message, 'reply_to') and event.message.reply_to:
-            # We would need to check if the reply is to our bot's message
-            # For now, we'll mark replies as potential direct messages
-            print(f"[DIRECT] Reply detected from {event.sender_id}")
-            return True
-            
-        return False
-        
-    except Exception as e:
-        print(f"[ERROR] Direct detection failed: {e}")
-        return False
-
-def is_mention_about_satya(event, message_data):
+def classify_message(event, message_data):
     """
-    Check if message mentions SATYA but is NOT direct:
-    - Contains "satya" (case-insensitive)
-    - Does NOT contain @satya_agent
-    - Is NOT a reply to SATYA
+    Find the workflow a group message triggers, in one pass over its text:
+    - Mention/keyword/regex triggers of the group's workflows, highest priority first
+    - Replies to one of our messages, for workflows with a reply trigger (checked against
+      the index of sent message ids, without fetching the replied-to message)
     """
     try:
-        text = message_data["message_text"].lower()
-        
-        # Skip if it's already a direct message
-        if is_direct_to_satya(event, message_data):
-            return False
-            
-        # Check for "satya" mentions
-        if "satya" in text:
-            print(f"[MENTION] 'satya' mentioned by {event.sender_id}")
-            return True
-            
-        return False
+        reply_to_msg_id = event.message.reply_to_msg_id
+        is_reply_to_us = reply_to_msg_id is not None and sent_messages.contains(event.chat_id, reply_to_msg_id)
+        rule = routing_table.classify(event.chat_id, message_data["message_text"], is_reply_to_us)
+        if rule is not None:
+            router_log.debug(f"{rule.name} trigger matched from {event.sender_id} in {event.chat_id}")
+        return rule
         
     except Exception as e:
-        print(f"[ERROR] Mention detection failed: {e}")
-        return False
+        print(f"[ERROR] Trigger detection failed: {e}")
+        return None
 
 # ===============================================================================
 # BURST COALESCING SYSTEM
 # ===============================================================================
 
-async def send_coalesced_direct_messages():
-    """Send coalesced direct messages after burst period"""
-    try:
-        if not burst_tracker["direct_messages"]:
-            return
-            
-        # Prepare coalesced payload
-        messages = burst_tracker["direct_messages"].copy()
-        burst_tracker["direct_messages"].clear()
-        burst_tracker["last_direct_send"] = datetime.utcnow()
-        burst_tracker["direct_timer"] = None
-        
-        print(f"[COALESCE] Sending {len(messages)} additional direct messages as follow-up")
-        
-        # Create coalesced payload
-        coalesced_payload = {
-            "workflow_type": f"group_{SATYA_GROUP_PUBLIC}_chatbot",
-            "burst_mode": True,
-            "message_count": len(messages),
-            "messages": messages,
-            "timestamp": datetime.utcnow().isoformat(),
-            "chat_id": SATYA_GROUP_PUBLIC,
-            "is_follow_up": True
-        }
-        
-        await route_to_n8n_workflow(f"group_{SATYA_GROUP_PUBLIC}_chatbot", coalesced_payload)
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to send coalesced direct messages: {e}")
-
-async def send_coalesced_mentions():
-    """Send coalesced mentions after burst period"""
-    try:
-        if not burst_tracker["mentions"]:
-            return
-            
-        # Prepare coalesced payload
-        messages = burst_tracker["mentions"].copy()
-        burst_tracker["mentions"].clear()
-        burst_tracker["last_mention_send"] = datetime.utcnow()
-        burst_tracker["mention_timer"] = None
-        
-        print(f"[COALESCE] Sending {len(messages)} additional mentions as follow-up")
-        
-        # Create coalesced payload
-        coalesced_payload = {
-            "workflow_type": f"group_{SATYA_GROUP_PUBLIC}_mentions",
-            "burst_mode": True,
-            "message_count": len(messages),
-            "messages": messages,
-            "timestamp": datetime.utcnow().isoformat(),
-            "chat_id": SATYA_GROUP_PUBLIC,
-            "is_follow_up": True
-        }
-        
-        await route_to_n8n_workflow(f"group_{SATYA_GROUP_PUBLIC}_mentions", coalesced_payload)
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to send coalesced mentions: {e}")
+def coalescing_key(workflow_type, message_data):
+    """Burst key: (workflow, chat, sender or None)"""
+    sender_id = message_data.get("sender_id") if COALESCE_BY_SENDER else None
+    return (workflow_type, message_data.get("chat_id"), sender_id)
+
+async def send_first_in_burst(key, message_data):
+    """Send the message that opens a burst immediately"""
+    workflow_type = key[0]
+    print(f"[IMMEDIATE] First message for {workflow_type} - sending immediately")
+    rule = routing_table.workflow(workflow_type)
+    if rule is not None and rule.resolve_entities:
+        await fill_entity_metadata([message_data])
+    await route_with_fallback(workflow_type, {
+        **message_data,
+        "workflow_type": workflow_type,
+        "burst_mode": False,
+        "message_count": 1,
+        "is_first_in_burst": True
+    })
+
+async def send_coalesced_messages(key, messages):
+    """Send the messages collected during a burst as one follow-up"""
+    workflow_type, chat_id, sender_id = key
+    print(f"[COALESCE] Sending {len(messages)} additional messages to {workflow_type} as follow-up")
+    rule = routing_table.workflow(workflow_type)
+    if rule is not None and rule.resolve_entities:
+        await fill_entity_metadata(messages)
+    
+    coalesced_payload = {
+        "workflow_type": workflow_type,
+        "burst_mode": True,
+        "message_count": len(messages),
+        "messages": messages,
+        "timestamp": datetime.utcnow().isoformat(),
+        "chat_id": chat_id,
+        "is_follow_up": True
+    }
+    if sender_id is not None:
+        coalesced_payload["sender_id"] = sender_id
+    
+    # Failed deliveries stay in the webhook outbox for redelivery
+    await route_to_n8n_workflow(workflow_type, coalesced_payload)
 
-async def handle_direct_message(message_data):
-    """Handle direct message: immediate first, coalesce additional"""
-    try:
-        # Check if this is the first message in a while
-        now = datetime.utcnow()
-        is_first_message = (
-            burst_tracker["last_direct_send"] is None or 
-            (now - burst_tracker["last_direct_send"]).total_seconds() > DIRECT_COALESCE_SECONDS
-        )
-        
-        if is_first_message:
-            # Send immediate response for first message
-            print(f"[IMMEDIATE] First direct message - sending immediately")
-            await route_with_fallback(f"group_{SATYA_GROUP_PUBLIC}_chatbot", {
-                **message_data,
-                "workflow_type": f"group_{SATYA_GROUP_PUBLIC}_chatbot",
-                "burst_mode": False,
-                "message_count": 1,
-                "is_first_in_burst": True
-            })
-            burst_tracker["last_direct_send"] = now
-            
-            # Start timer for additional messages
-            if burst_tracker["direct_timer"] is None:
-                print(f"[COALESCE] Starting timer for additional direct messages ({DIRECT_COALESCE_SECONDS}s)")
-                burst_tracker["direct_timer"] = asyncio.create_task(
-                    asyncio.sleep(DIRECT_COALESCE_SECONDS)
-                )
-                
-                # Wait for timer and send any additional messages
-                await burst_tracker["direct_timer"]
-                if burst_tracker["direct_messages"]:
-                    await send_coalesced_direct_messages()
-                burst_tracker["direct_timer"] = None
-        else:
-            # Add to burst queue for follow-up response
-            print(f"[COALESCE] Adding to direct message burst queue")
-            burst_tracker["direct_messages"].append(message_data)
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to handle direct message: {e}")
+# One engine for all workflows, chats and senders, driven by a single timer
+burst_coalescer = CoalescingEngine(send_first_in_burst, send_coalesced_messages)
 
-async def handle_mention_message(message_data):
-    """Handle mention message: immediate first, coalesce additional"""
+async def handle_routed_message(rule, message_data):
+    """Handle a triggered message: immediate first, coalesce additional"""
     try:
-        # Check if this is the first message in a while
-        now = datetime.utcnow()
-        is_first_message = (
-            burst_tracker["last_mention_send"] is None or 
-            (now - burst_tracker["last_mention_send"]).total_seconds() > MENTIONS_COALESCE_SECONDS
-        )
-        
-        if is_first_message:
-            # Send immediate response for first message
-            print(f"[IMMEDIATE] First mention - sending immediately")
-            await route_with_fallback(f"group_{SATYA_GROUP_PUBLIC}_mentions", {
-                **message_data,
-                "workflow_type": f"group_{SATYA_GROUP_PUBLIC}_mentions",
-                "burst_mode": False,
-                "message_count": 1,
-                "is_first_in_burst": True
-            })
-            burst_tracker["last_mention_send"] = now
-            
-            # Start timer for additional messages
-            if burst_tracker["mention_timer"] is None:
-                print(f"[COALESCE] Starting timer for additional mentions ({MENTIONS_COALESCE_SECONDS}s)")
-                burst_tracker["mention_timer"] = asyncio.create_task(
-                    asyncio.sleep(MENTIONS_COALESCE_SECONDS)
-                )
-                
-                # Wait for timer and send any additional messages
-                await burst_tracker["mention_timer"]
-                if burst_tracker["mentions"]:
-                    await send_coalesced_mentions()
-                burst_tracker["mention_timer"] = None
-        else:
-            # Add to burst queue for follow-up response
-            print(f"[COALESCE] Adding to mention burst queue")
-            burst_tracker["mentions"].append(message_data)
+        key = coalescing_key(rule.workflow_type, message_data)
+        if not await burst_coalescer.submit(key, message_data, rule.coalesce_seconds):
+            print(f"[COALESCE] Adding to {rule.workflow_type} burst queue")
         
     except Exception as e:
-        print(f"[ERROR] Failed to handle mention message: {e}")
+        print(f"[ERROR] Failed to handle {rule.workflow_type} message: {e}")
 
 # ===============================================================================
 # WORKFLOW ROUTING SYSTEM
@@ -287,11 +226,27 @@ async def handle_mention_message(message_data):
 
 # n8n webhook endpoints configuration
 N8N_WEBHOOK_BASE_URL = os.getenv("N8N_WEBHOOK_BASE_URL", "https://your-n8n-instance.com")
-WEBHOOK_ENDPOINTS = {
-    "superuser": f"{N8N_WEBHOOK_BASE_URL}/webhook/satya/superuser",
-    f"group_{SATYA_GROUP_PUBLIC}_chatbot": f"{N8N_WEBHOOK_BASE_URL}/webhook/satya/group/{SATYA_GROUP_PUBLIC}/chatbot", 
-    f"group_{SATYA_GROUP_PUBLIC}_mentions": f"{N8N_WEBHOOK_BASE_URL}/webhook/satya/group/{SATYA_GROUP_PUBLIC}/mentions"
-}
+WEBHOOK_ENDPOINTS = routing_table.webhook_endpoints(N8N_WEBHOOK_BASE_URL)
+
+# One pooled HTTP session (keep-alive, connection limits) shared by every webhook call.
+# Opened when the Telegram client starts and closed when it stops.
+webhook_client = WebhookClient()
+
+# Durable outbox: every event is stored before it is posted and redelivered until n8n
+# acknowledges it with a 2xx response
+webhook_outbox = WebhookOutbox(STATE_DB_PATH, webhook_client)
+
+# Workflows with a "batch" rule get their events posted together (see routing_rules.py)
+webhook_batcher = WebhookBatcher(webhook_outbox)
+
+def build_webhook_payload(workflow_type: str, message_data: dict):
+    """Prepare payload for n8n"""
+    return {
+        "workflow_type": workflow_type,
+        "message_data": message_data,
+        "timestamp": datetime.utcnow().isoformat(),
+        "mcp_server": "satya-telegram-mcp.onrender.com"
+    }
 
 async def route_to_n8n_workflow(workflow_type: str, message_data: dict):
     """Route message to specific n8n workflow based on tier"""
@@ -301,32 +256,28 @@ async def route_to_n8n_workflow(workflow_type: str, message_data: dict):
             print(f"[ERROR] Unknown workflow type: {workflow_type}")
             return False
             
-        # Prepare payload for n8n
-        payload = {
-            "workflow_type": workflow_type,
-            "message_data": message_data,
-            "timestamp": datetime.utcnow().isoformat(),
-            "mcp_server": "satya-telegram-mcp.onrender.com"
-        }
+        payload = build_webhook_payload(workflow_type, message_data)
         
         print(f"[ROUTE] Sending to {workflow_type} workflow")
-        print(f"[PAYLOAD] {json.dumps(payload, indent=2)}")
-        
-        # Make actual HTTP call to n8n webhook
-        timeout = aiohttp.ClientTimeout(total=10)  # 10 second timeout
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status == 200:
-                    response_text = await response.text()
-                    print(f"[SUCCESS] n8n webhook response: {response_text}")
-                    return True
-                else:
-                    print(f"[ERROR] n8n webhook failed: {response.status}")
-                    return False
+        if router_log.isEnabledFor(logging.DEBUG):
+            router_log.debug(f"Payload {serialization.dumps(payload)}")
+        
+        rule = routing_table.workflow(workflow_type)
+        if rule is not None and rule.batch_max_events:
+            # Stored in the outbox and posted with the rest of the batch
+            event_id = webhook_batcher.add(workflow_type, webhook_url, payload, rule.batch_max_events, rule.batch_max_latency)
+            print(f"[BATCH] Event {event_id} queued for the next {workflow_type} batch")
+            return True
+        
+        # Persist before the attempt; the outbox worker redelivers it unless n8n returns 2xx
+        event_id = webhook_outbox.enqueue(workflow_type, webhook_url, payload)
+        success, response_text = await webhook_outbox.deliver(event_id, webhook_url, payload)
+        if success:
+            print(f"[SUCCESS] n8n webhook response: {response_text}")
+        else:
+            print(f"[ERROR] n8n webhook failed: {response_text} (queued for redelivery)")
+        return success
         
-    except asyncio.TimeoutError:
-        print(f"[ERROR] Timeout calling n8n webhook for {workflow_type}")
-        return False
     except Exception as e:
         print(f"[ERROR] Failed to route to n8n workflow {workflow_type}: {e}")
         traceback.print_exc()
@@ -343,21 +294,9 @@ async def store_message_locally(message_data: dict, storage_type: str = "log"):
             "mcp_version": "v1.0"
         }
         
-        # For now, just pretty print to console
-        # TODO: Replace with actual database/file storage
-        print(f"[STORAGE] {storage_type.upper()} - Message stored:")
-        print(f"{json.dumps(storage_record, indent=2)}")
-        
-        # TODO: Implement actual storage
-        """
-        # Option 1: File-based storage
-        log_file = f"telegram_messages_{datetime.now().strftime('%Y%m%d')}.jsonl"
-        with open(log_file, 'a') as f:
-            f.write(json.dumps(storage_record) + '\n')
-            
-        # Option 2: SQLite database storage
-        # INSERT INTO telegram_messages (...) VALUES (...)
-        """
+        # Append to the message_log table next to the webhook outbox
+        record_id = webhook_outbox.log_message(storage_type, storage_record)
+        print(f"[STORAGE] {storage_type.upper()} - Message stored (record {record_id})")
         
         return True
         
@@ -371,7 +310,8 @@ async def handle_routing_failure(message_data: dict, intended_workflow: str, err
     try:
         print(f"[FALLBACK] Routing to {intended_workflow} failed: {error}")
         
-        # Always store the message locally as fallback
+        # The event itself is already in the outbox and will be redelivered; keep a
+        # local record of the failure as well
         fallback_data = {
             **message_data,
             "intended_workflow": intended_workflow,
@@ -411,6 +351,31 @@ async def route_with_fallback(workflow_type: str, message_data: dict):
         await handle_routing_failure(message_data, workflow_type, str(e))
         return False
 
+# ===============================================================================
+# DISPATCH STAGE
+# ===============================================================================
+
+async def process_routed_message(job):
+    """Worker side of the dispatcher: deliver one routed message"""
+    workflow_type, rule, message_data = job
+    if rule is None:
+        await route_with_fallback(workflow_type, message_data)
+    else:
+        await handle_routed_message(rule, message_data)
+
+def spill_routed_message(job):
+    """Overflow: write the message straight to the webhook outbox, bypassing coalescing"""
+    workflow_type, rule, message_data = job
+    webhook_url = WEBHOOK_ENDPOINTS.get(workflow_type)
+    if webhook_url:
+        payload = build_webhook_payload(workflow_type, {**message_data, "spilled": True})
+        batch_max = rule.batch_max_events if rule is not None else None
+        webhook_outbox.enqueue(workflow_type, webhook_url, payload, deliver=False, batch_max=batch_max)
+
+# The update handler only enqueues (workflow_type, rule, message_data); a fixed pool of
+# workers does the routing. DISPATCH_OVERFLOW=spill|drop_oldest decides what a full queue does.
+routing_dispatcher = Dispatcher(process_routed_message, spill=spill_routed_message)
+
 # ===============================================================================
 # SIMPLE ADMIN TOOLS FOR PUBLIC GROUP
 # ===============================================================================
@@ -419,27 +384,71 @@ async def route_with_fallback(workflow_type: str, message_data: dict):
 async def get_public_group_status() -> str:
     """Get current status of SATYA public group monitoring."""
     try:
+        outbox = webhook_outbox.stats()
+        sent_index = sent_messages.stats()
+        dispatch = routing_dispatcher.snapshot()
+        http = webhook_client.stats()
+        batches = webhook_batcher.snapshot()
+        bursts = burst_coalescer.snapshot()
+        reads = read_cache.snapshot()
+        pending = {}
+        for entry in bursts["pending_keys"]:
+            pending[entry["key"][0]] = pending.get(entry["key"][0], 0) + entry["pending"]
+        
+        group_lines = []
+        for chat_id, group in routing_table.groups.items():
+            group_lines.append(f"📍 Group {chat_id}:")
+            for rule in group.workflows:
+                group_lines.append(
+                    f"  • {rule.name}: {rule.coalesce_seconds:g}s bursts, "
+                    f"{pending.get(rule.workflow_type, 0)} pending → {WEBHOOK_ENDPOINTS[rule.workflow_type]}"
+                )
+        groups_report = "\n".join(group_lines)
+        
         status_report = f"""
 🤖 SATYA Public Group Status Report
 
-📍 Public Group: {SATYA_GROUP_PUBLIC}
 👤 Superuser ID: {SUPER_USER_ID}
 🤖 Bot Username: @{BOT_USERNAME}
+📄 Routing Config: {ROUTING_CONFIG_PATH or 'built-in defaults'}
+
+{groups_report}
 
 ⏱️ Burst Coalescing:
-  • Direct Messages: {DIRECT_COALESCE_SECONDS}s
-  • Mentions: {MENTIONS_COALESCE_SECONDS}s
+  • Split by Sender: {'Yes' if COALESCE_BY_SENDER else 'No'}
+  • Max Batch Size: {burst_coalescer.max_batch}
 
 📊 Current Burst Status:
-  • Pending Direct: {len(burst_tracker['direct_messages'])}
-  • Pending Mentions: {len(burst_tracker['mentions'])}
-  • Direct Timer Active: {'Yes' if burst_tracker['direct_timer'] else 'No'}
-  • Mention Timer Active: {'Yes' if burst_tracker['mention_timer'] else 'No'}
-
-🔗 Webhook Endpoints:
-  • Superuser: {WEBHOOK_ENDPOINTS['superuser']}
-  • Group {SATYA_GROUP_PUBLIC} Chatbot: {WEBHOOK_ENDPOINTS[f'group_{SATYA_GROUP_PUBLIC}_chatbot']}
-  • Group {SATYA_GROUP_PUBLIC} Mentions: {WEBHOOK_ENDPOINTS[f'group_{SATYA_GROUP_PUBLIC}_mentions']}
+  • Active Bursts: {bursts['keys']}
+  • Pending: {bursts['pending']}
+  • Next Flush In: {bursts['next_flush_in'] if bursts['next_flush_in'] is not None else '-'}s
+  • Sent Immediately / Coalesced / Batches: {bursts['immediate']} / {bursts['coalesced']} / {bursts['batches']}
+
+💬 Sent Message Index: {sent_index['messages']} messages in {sent_index['chats']} chats
+
+🚦 Dispatcher ({dispatch['workers']} workers, overflow: {dispatch['overflow']}):
+  • Queue Depth: {dispatch['depth']}/{dispatch['capacity']} (max {dispatch['max_depth']})
+  • Queue Wait p50/p99: {dispatch['wait_ms_p50']} / {dispatch['wait_ms_p99']} ms
+  • Processed / Failed: {dispatch['processed']} / {dispatch['failed']}
+  • Spilled / Dropped: {dispatch['spilled']} / {dispatch['dropped']}
+
+📦 Webhook Requests:
+  • Requests Sent: {http['requests']}
+  • Bytes Sent / Uncompressed: {http['bytes_sent']} / {http['bytes_uncompressed']}
+  • Batched Events / Batches: {batches['events']} / {batches['batches']} ({batches['waiting']} waiting)
+
+📮 Webhook Outbox:
+  • Pending Redelivery: {outbox['pending']}
+  • Oldest Pending: {outbox['oldest_pending_seconds'] or 0}s
+  • Delivered / Redelivered: {outbox['delivered']} / {outbox['redelivered']}
+  • Failed Attempts: {outbox['failed_attempts']}
+
+📖 REST Read Cache:
+  • Cached Views: {reads['entries']} ({reads['building']} building)
+  • Hits / Builds / Shared Builds: {reads['hits']} / {reads['builds']} / {reads['shared_builds']}
+  • Invalidations: {reads['invalidations']}
+
+🔗 Superuser Webhook: {WEBHOOK_ENDPOINTS['superuser']}
 """
         
         print(f"[STATUS] Public group status requested")
@@ -463,6 +472,9 @@ async def update_super_user(new_user_id: int) -> str:
         old_user_id = SUPER_USER_ID
         SUPER_USER_ID = new_user_id
         
+        # The router only receives the monitored groups and the super-user's chat
+        register_router()
+        
         result = f"⚠️ CRITICAL: Super-user changed from {old_user_id} to {new_user_id}"
         print(f"[CRITICAL] {result}")
         return result
@@ -478,16 +490,14 @@ async def force_send_pending_messages() -> str:
     Force send all pending messages immediately (bypass coalescing).
     """
     try:
-        direct_count = len(burst_tracker["direct_messages"])
-        mention_count = len(burst_tracker["mentions"])
-        
-        if direct_count > 0:
-            await send_coalesced_direct_messages()
-        
-        if mention_count > 0:
-            await send_coalesced_mentions()
-        
-        result = f"✅ Force-sent {direct_count} direct messages and {mention_count} mentions"
+        flushed = burst_coalescer.flush_all()
+        per_workflow = {}
+        for key, count in flushed.items():
+            per_workflow[key[0]] = per_workflow.get(key[0], 0) + count
+        await burst_coalescer.drain()
+        
+        details = ", ".join(f"{workflow}: {count}" for workflow, count in per_workflow.items())
+        result = f"✅ Force-sent {sum(per_workflow.values())} pending messages" + (f" ({details})" if details else "")
         print(f"[ADMIN] {result}")
         return result
         
@@ -499,32 +509,105 @@ async def force_send_pending_messages() -> str:
 # ===============================================================================
 
 
-# Global variable to store the telegram event loop
+# Loop the Telegram client runs on (the HTTP server's loop unless in legacy thread mode)
 telegram_loop = None
 
-async def _telegram_runner():
+async def start_telegram():
+    """Connect the client and start the routing and delivery services on the running loop"""
     global telegram_loop
-    telegram_loop = asyncio.get_event_loop()
+    telegram_loop = asyncio.get_running_loop()
     
+    register_router()
+    client.remove_event_handler(invalidate_read_cache)
+    client.add_event_handler(invalidate_read_cache, events.Raw)
     await client.start()
     me = await client.get_me()
     print(f"[TG] Signed in as {me.username or me.first_name} ({me.id})")
-    await client.run_until_disconnected()
+    broadcast_queue.resume()
+    await webhook_client.start()
+    webhook_outbox.start()
+    routing_dispatcher.start()
+
+async def stop_telegram():
+    """Drain and stop the routing and delivery services, then disconnect the client"""
+    await routing_dispatcher.stop()
+    await burst_coalescer.close()
+    await webhook_batcher.close()
+    await webhook_outbox.stop()
+    await webhook_client.close()
+    await client.disconnect()
+    print("[TG] Disconnected")
+
+@contextlib.asynccontextmanager
+async def telegram_lifespan(app, mcp_lifespan):
+    """ASGI lifespan: Telegram starts before the MCP session manager and stops after it"""
+    await start_telegram()
+    try:
+        async with mcp_lifespan(app):
+            yield
+    finally:
+        await stop_telegram()
+
+async def _telegram_runner():
+    await start_telegram()
+    try:
+        await client.run_until_disconnected()
+    finally:
+        await stop_telegram()
 
 def _start_telegram():
     asyncio.run(_telegram_runner())
 
-@client.on(events.NewMessage)
+# Chats the router receives: monitored groups plus the super-user's direct chat
+routed_chats = set()
+routed_messages = 0
+
+def register_router():
+    """(Re-)register the router for the current routing rules and super-user"""
+    global routed_chats
+    routed_chats = set(routing_table.groups)
+    if SUPER_USER_ID:
+        routed_chats.add(SUPER_USER_ID)
+    client.remove_event_handler(public_group_message_router)
+    client.remove_event_handler(superuser_message_router)
+    client.remove_event_handler(index_outgoing_message)
+    # Telethon drops updates from other chats before the handler is called
+    client.add_event_handler(public_group_message_router, events.NewMessage(chats=list(routed_chats)))
+    # The super-user is routed from any chat, not just the DM and the monitored groups
+    if SUPER_USER_ID:
+        client.add_event_handler(superuser_message_router, events.NewMessage(from_users=[SUPER_USER_ID]))
+    # Our own messages in the monitored groups, including ones sent from other devices
+    client.add_event_handler(index_outgoing_message, events.NewMessage(chats=list(routing_table.groups), outgoing=True))
+    print(f"[ROUTER] Listening to {len(routed_chats)} chats")
+
+async def index_outgoing_message(event):
+    """Remember ids of messages we send so replies to them can be recognised"""
+    sent_messages.add(event.chat_id, event.id)
+
+async def superuser_message_router(event):
+    """Route super-user messages from chats the main router does not listen to"""
+    if event.chat_id in routed_chats:
+        return  # public_group_message_router already handles it
+    await public_group_message_router(event)
+
 async def public_group_message_router(event):
-    """Focused message router for SATYA public group with burst coalescing"""
+    """Message router for the monitored groups with burst coalescing"""
+    global routed_messages
     
-    # PRESERVE EXISTING LOGGING
-    print(f"[TG] ↪️  Msg from {event.sender_id} in {event.chat_id}: {event.raw_text!r}")
+    # Cheap pre-check, in case an update slips past the chats filter
+    if event.chat_id not in routed_chats and not is_superuser_message(event):
+        return
+    
+    routed_messages += 1
+    if router_log.isEnabledFor(logging.DEBUG):
+        router_log.debug(f"Msg from {event.sender_id} in {event.chat_id}: {event.raw_text!r}")
+    elif (routed_messages - 1) % ROUTER_LOG_SAMPLE_EVERY == 0 and router_log.isEnabledFor(logging.INFO):
+        router_log.info(f"Msg from {event.sender_id} in {event.chat_id} ({routed_messages} routed so far)")
     
     try:
-        # STEP 1: Only process messages from public group or superuser
+        # STEP 1: Only process messages from monitored groups or superuser
         if not is_from_public_group(event) and not is_superuser_message(event):
-            print(f"[IGNORE] Message not from public group or superuser: {event.chat_id}")
+            router_log.debug(f"Message not from a monitored group or superuser: {event.chat_id}")
             return
         
         # STEP 2: Capture structured message data
@@ -533,25 +616,18 @@ async def public_group_message_router(event):
         # STEP 3: SUPERUSER always gets immediate response (override burst coalescing)
         if is_superuser_message(event):
             print(f"[SUPERUSER] Priority message from {event.sender_id}")
-            await route_with_fallback("superuser", message_data)
+            routing_dispatcher.submit(("superuser", None, message_data))
             return
         
-        # STEP 4: Check if direct message to SATYA
-        if is_direct_to_satya(event, message_data):
-            print(f"[DIRECT] Direct message to SATYA from {event.sender_id}")
-            # Use burst coalescing for direct messages
-            asyncio.create_task(handle_direct_message(message_data))
+        # STEP 4: Find the highest-priority workflow the message triggers
+        rule = classify_message(event, message_data)
+        if rule is not None:
+            # Hand off to the dispatcher workers, which apply burst coalescing
+            routing_dispatcher.submit((rule.workflow_type, rule, message_data))
             return
         
-        # STEP 5: Check if mention about SATYA  
-        if is_mention_about_satya(event, message_data):
-            print(f"[MENTION] Mention about SATYA from {event.sender_id}")
-            # Use burst coalescing for mentions
-            asyncio.create_task(handle_mention_message(message_data))
-            return
-        
-        # STEP 6: Ignore all other messages from public group
-        print(f"[IGNORE] No SATYA trigger detected from {event.sender_id}")
+        # STEP 5: Ignore all other messages from monitored groups
+        router_log.debug(f"No trigger detected from {event.sender_id}")
         
     except Exception as e:
         print(f"[CRITICAL] Message router failed: {e}")
@@ -578,6 +654,73 @@ async def public_group_message_router(event):
 # REST API ENDPOINTS FOR N8N INTEGRATION  
 # ===============================================================================
 
+# Seconds a REST send may take before the request fails
+REST_SEND_TIMEOUT = float(os.getenv("REST_SEND_TIMEOUT", "30"))
+# Batch endpoint: messages per request and concurrent sends per batch
+REST_BATCH_MAX_MESSAGES = int(os.getenv("REST_BATCH_MAX_MESSAGES", "100"))
+REST_BATCH_CONCURRENCY = int(os.getenv("REST_BATCH_CONCURRENCY", "4"))
+# Seconds a batch request may take in total
+REST_BATCH_TIMEOUT = float(os.getenv("REST_BATCH_TIMEOUT", "60"))
+
+async def run_on_telegram_loop(coro, timeout=None):
+    """Await a coroutine on the Telegram client's loop without blocking the HTTP loop"""
+    timeout = REST_SEND_TIMEOUT if timeout is None else timeout
+    if telegram_loop is None:
+        coro.close()
+        raise RuntimeError("Telegram client not ready")
+    if telegram_loop is asyncio.get_running_loop():
+        return await asyncio.wait_for(coro, timeout)
+    future = asyncio.run_coroutine_threadsafe(coro, telegram_loop)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    finally:
+        # Cancelling the wrapper does not stop the coroutine on the other loop
+        future.cancel()
+
+async def send_message_batch(messages, timeout):
+    """
+    Send every message of a batch. Messages to the same chat go one after another in request
+    order; different chats are sent in parallel, at most REST_BATCH_CONCURRENCY sends at a
+    time. At the `timeout` deadline the remaining sends are cancelled: a message that was
+    never started is reported as not sent, one cancelled mid-request as possibly sent.
+    """
+    semaphore = asyncio.Semaphore(REST_BATCH_CONCURRENCY)
+    started = [False] * len(messages)
+    outcomes = [None] * len(messages)
+    
+    by_chat = {}
+    for i, item in enumerate(messages):
+        by_chat.setdefault(str(item["chat_id"]), []).append(i)
+    
+    async def send_chat(indexes):
+        for i in indexes:
+            async with semaphore:
+                started[i] = True
+                try:
+                    outcomes[i] = await send_message(messages[i]["chat_id"], messages[i]["message"])
+                except Exception as e:
+                    outcomes[i] = e
+    
+    tasks = [asyncio.ensure_future(send_chat(indexes)) for indexes in by_chat.values()]
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    results = []
+    for item, was_started, outcome in zip(messages, started, outcomes):
+        if outcome is None and not was_started:
+            status, result = "not_sent", f"Timed out: not sent within {timeout:g} seconds"
+        elif outcome is None:
+            # Cancelled while the request was out; Telegram may already have delivered it
+            status, result = "unknown", f"Timed out after {timeout:g} seconds: possibly sent"
+        elif isinstance(outcome, Exception):
+            status, result = "failed", f"Error: {outcome}"
+        else:
+            status, result = ("sent" if outcome == "Message sent successfully." else "failed"), outcome
+        results.append({"chat_id": item["chat_id"], "success": status == "sent", "status": status, "result": result})
+    return results
+
 # Add REST endpoint using FastMCP's custom route system
 @mcp.custom_route("/send_telegram_message", methods=["POST"])
 async def send_telegram_message_rest(request):
@@ -597,7 +740,6 @@ async def send_telegram_message_rest(request):
         message = request_data.get("message")
         
         if not chat_id or not message:
-            from starlette.responses import JSONResponse
             return JSONResponse({
                 "success": False, 
                 "error": "Missing required fields: chat_id and message"
@@ -605,19 +747,14 @@ async def send_telegram_message_rest(request):
         
         print(f"[REST] Sending message to chat {chat_id}: {message}")
         
-        # Call the MCP tool in the correct event loop
-        if telegram_loop is None:
-            result = "Error: Telegram client not ready"
-        else:
-            future = asyncio.run_coroutine_threadsafe(
-                send_message(chat_id, message), 
-                telegram_loop
-            )
-            result = future.result(timeout=30)  # 30 second timeout
+        # Run the MCP tool on the Telegram loop; other requests are served meanwhile
+        try:
+            result = await run_on_telegram_loop(send_message(chat_id, message))
+        except RuntimeError as e:
+            result = f"Error: {e}"
         
         print(f"[REST] Message sent successfully: {result}")
         
-        from starlette.responses import JSONResponse
         return JSONResponse({
             "success": True, 
             "result": result,
@@ -625,36 +762,261 @@ async def send_telegram_message_rest(request):
             "message": message
         })
         
+    except asyncio.TimeoutError:
+        error_msg = f"Failed to send message: no response within {REST_SEND_TIMEOUT:g} seconds"
+        print(f"[REST ERROR] {error_msg}")
+        return JSONResponse({"success": False, "error": error_msg}, status_code=504)
     except Exception as e:
         error_msg = f"Failed to send message: {str(e)}"
         print(f"[REST ERROR] {error_msg}")
         
-        from starlette.responses import JSONResponse
         return JSONResponse({
             "success": False,
             "error": error_msg
         }, status_code=500)
 
+@mcp.custom_route("/send_telegram_messages", methods=["POST"])
+async def send_telegram_messages_rest(request):
+    """
+    Batch REST endpoint for n8n: many sends in one HTTP call.
+    
+    POST /send_telegram_messages
+    Body: {"messages": [{"chat_id": 123456, "message": "Hello"}, ...]}
+    
+    Returns one result per message, in request order, with a status of "sent", "failed",
+    "not_sent" (the REST_BATCH_TIMEOUT deadline passed before it was started) or "unknown"
+    (cancelled at the deadline mid-request, so it may have been delivered; don't blindly retry).
+    """
+    try:
+        request_data = await request.json()
+        messages = request_data.get("messages") if isinstance(request_data, dict) else None
+        
+        if not isinstance(messages, list) or not messages:
+            return JSONResponse({
+                "success": False,
+                "error": "Missing required field: messages (non-empty list)"
+            }, status_code=400)
+        if len(messages) > REST_BATCH_MAX_MESSAGES:
+            return JSONResponse({
+                "success": False,
+                "error": f"Too many messages: {len(messages)} (max {REST_BATCH_MAX_MESSAGES})"
+            }, status_code=413)
+        invalid = [
+            i for i, item in enumerate(messages)
+            if not isinstance(item, dict) or not item.get("chat_id") or not item.get("message")
+        ]
+        if invalid:
+            return JSONResponse({
+                "success": False,
+                "error": f"Messages without chat_id or message at positions {invalid}"
+            }, status_code=400)
+        
+        print(f"[REST] Sending batch of {len(messages)} messages")
+        
+        # One deadline for the whole request; unsent messages come back as timed out
+        results = await run_on_telegram_loop(
+            send_message_batch(messages, REST_BATCH_TIMEOUT), timeout=REST_BATCH_TIMEOUT + 5
+        )
+        sent = sum(1 for r in results if r["success"])
+        unknown = sum(1 for r in results if r["status"] == "unknown")
+        
+        print(f"[REST] Batch sent: {sent}/{len(results)} succeeded, {unknown} possibly sent")
+        
+        return JSONResponse({
+            "success": sent == len(results),
+            "sent": sent,
+            "failed": len(results) - sent - unknown,
+            "unknown": unknown,
+            "results": results,
+        })
+        
+    except asyncio.TimeoutError:
+        error_msg = "Failed to send batch: timed out"
+        print(f"[REST ERROR] {error_msg}")
+        return JSONResponse({"success": False, "error": error_msg}, status_code=504)
+    except Exception as e:
+        error_msg = f"Failed to send batch: {str(e)}"
+        print(f"[REST ERROR] {error_msg}")
+        return JSONResponse({"success": False, "error": error_msg}, status_code=500)
+
+# ===============================================================================
+# REST READ ENDPOINTS (CACHED, WITH ETAGS)
+# ===============================================================================
+
+# Seconds n8n (or any HTTP cache) may reuse a response without revalidating
+REST_READ_MAX_AGE = int(os.getenv("REST_READ_MAX_AGE", "5"))
+REST_MAX_DIALOGS = int(os.getenv("REST_MAX_DIALOGS", "500"))
+REST_MAX_MESSAGES = int(os.getenv("REST_MAX_MESSAGES", "100"))
+
+read_cache = ReadCache()
+
+async def invalidate_read_cache(update):
+    """Drop cached REST views of every chat a raw update touches"""
+    read_cache.apply_update(update)
+
+def query_limit(request, default, maximum):
+    """The `limit` query parameter, clamped to 1..maximum"""
+    return max(1, min(int(request.query_params.get("limit", default)), maximum))
+
+async def chat_scope(chat_id):
+    """Marked peer id of a chat as given by the caller (id, marked id or username)"""
+    try:
+        chat_id = int(chat_id)
+    except ValueError:
+        pass
+    return utils.get_peer_id(await client.get_input_entity(chat_id))
+
+async def build_dialogs_view(limit):
+    dialogs = await client.get_dialogs(limit=limit)
+    chats = []
+    for dialog in dialogs:
+        chats.append({
+            **format_entity(dialog.entity),
+            "peer_id": dialog.id,
+            "unread_count": dialog.unread_count,
+            "pinned": dialog.pinned,
+            "last_message": format_message(dialog.message) if dialog.message else None,
+        })
+    return {"chats": chats}
+
+async def build_messages_view(peer_id, limit):
+    messages = await client.get_messages(peer_id, limit=limit)
+    return {"peer_id": peer_id, "messages": [format_message(m) for m in messages]}
+
+async def build_chat_view(peer_id):
+    entity = await client.get_entity(peer_id)
+    info = {**format_entity(entity), "peer_id": peer_id}
+    if isinstance(entity, types.Channel):
+        info["megagroup"] = bool(entity.megagroup)
+        info["broadcast"] = bool(entity.broadcast)
+        if entity.username:
+            info["username"] = entity.username
+    elif isinstance(entity, types.User):
+        info["bot"] = bool(entity.bot)
+    if isinstance(entity, types.Chat):
+        # Basic groups carry their member count on the entity itself
+        info["participants_count"] = entity.participants_count
+    elif isinstance(entity, types.Channel):
+        # Full channel info has the count without admin rights (get_participants needs them in
+        # broadcast channels); the view is still served without it if the request fails
+        try:
+            full = await client(functions.channels.GetFullChannelRequest(entity))
+            info["participants_count"] = full.full_chat.participants_count
+        except RPCError as e:
+            print(f"[REST] No participant count for {peer_id}: {e}")
+    return info
+
+async def read_view(key, chat_id, build):
+    """Resolve the chat (if any) and return its cached view; runs on the Telegram loop"""
+    scope = await chat_scope(chat_id) if chat_id is not None else None
+    return await read_cache.get(key + (scope,), scope, lambda: build(scope))
+
+async def cached_json_response(request, key, chat_id, build):
+    """A cached view as JSON with its ETag, or 304 when the caller already has it"""
+    headers = {"Cache-Control": f"private, max-age={REST_READ_MAX_AGE}"}
+    try:
+        view = await run_on_telegram_loop(read_view(key, chat_id, build))
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=404)
+    except asyncio.TimeoutError:
+        return JSONResponse({"success": False, "error": "Telegram did not answer in time"}, status_code=504)
+    except Exception as e:
+        print(f"[REST ERROR] Failed to read {key[0]}: {e}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    headers["ETag"] = view.etag
+    if view.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(view.body, media_type="application/json", headers=headers)
+
+@mcp.custom_route("/chats", methods=["GET"])
+async def list_chats_rest(request):
+    """
+    Dialog list for n8n polling, newest first.
+    
+    GET /chats?limit=100
+    """
+    try:
+        limit = query_limit(request, 100, REST_MAX_DIALOGS)
+    except ValueError:
+        return JSONResponse({"success": False, "error": "limit must be an integer"}, status_code=400)
+    return await cached_json_response(
+        request, ("dialogs", limit), None, lambda scope: build_dialogs_view(limit)
+    )
+
+@mcp.custom_route("/chats/{chat_id}", methods=["GET"])
+async def get_chat_rest(request):
+    """
+    Chat info: name, type, username and member count.
+    
+    GET /chats/-1002536132364
+    """
+    return await cached_json_response(
+        request, ("chat",), request.path_params["chat_id"], build_chat_view
+    )
+
+@mcp.custom_route("/chats/{chat_id}/messages", methods=["GET"])
+async def get_messages_rest(request):
+    """
+    Most recent messages of a chat, newest first.
+    
+    GET /chats/-1002536132364/messages?limit=20
+    """
+    try:
+        limit = query_limit(request, 20, REST_MAX_MESSAGES)
+    except ValueError:
+        return JSONResponse({"success": False, "error": "limit must be an integer"}, status_code=400)
+    return await cached_json_response(
+        request,
+        ("messages", limit),
+        request.path_params["chat_id"],
+        lambda scope: build_messages_view(scope, limit),
+    )
+
 # Health check endpoint
 @mcp.custom_route("/health", methods=["GET"])
 async def health_check(request):
     """Health check endpoint for monitoring"""
-    from starlette.responses import JSONResponse
     return JSONResponse({"status": "healthy", "service": "satya-telegram-mcp"})
 
+# ===============================================================================
+# STARTUP
+# ===============================================================================
+
+# Telethon and the HTTP server share one event loop by default. MCP_LEGACY_THREAD_LOOP=1
+# restores the previous layout (Telethon on its own loop in a daemon thread), where every
+# HTTP request that touches Telegram crosses loops.
+LEGACY_THREAD_LOOP = os.getenv("MCP_LEGACY_THREAD_LOOP", "0") == "1"
+
+def create_app():
+    """MCP streamable HTTP app (with the REST routes); Telegram runs in its lifespan"""
+    # FastMCP exposes the ASGI app here
+    app = mcp.streamable_http_app()
+    if not LEGACY_THREAD_LOOP:
+        mcp_lifespan = app.router.lifespan_context
+        app.router.lifespan_context = lambda app: telegram_lifespan(app, mcp_lifespan)
+    return app
+
+async def serve():
+    config = uvicorn.Config(
+        create_app(),
+        host="0.0.0.0",
+        port=int(os.environ["PORT"]),
+        log_level="info",
+        lifespan="on",
+    )
+    server = uvicorn.Server(config)
+    await server.serve()
+    if not server.started:
+        # Startup failed (e.g. the Telegram client could not sign in), uvicorn logged why
+        sys.exit(1)
+
 if __name__ == "__main__":
-    threading.Thread(target=_start_telegram, name="tg-loop", daemon=True).start()
+    if LEGACY_THREAD_LOOP:
+        print("[STARTUP] Legacy mode: Telegram client on a separate thread and loop")
+        threading.Thread(target=_start_telegram, name="tg-loop", daemon=True).start()
 
     try:
-        # FastMCP exposes the ASGI app here
-        app = mcp.streamable_http_app()
-
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=int(os.environ["PORT"]),
-            log_level="info",
-        )
+        asyncio.run(serve())
     except Exception:
         traceback.print_exc()
         sys.exit(1)
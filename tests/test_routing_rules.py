@@ -0,0 +1,31 @@
+from routing_rules import GroupRules
+
+
+def group(*patterns):
+    return GroupRules(
+        {
+            "chat_id": -100,
+            "workflows": [
+                {"name": f"w{i}", "triggers": [{"type": "regex", "value": rx}]}
+                for i, rx in enumerate(patterns)
+            ],
+        }
+    )
+
+
+def test_overlapping_regex_triggers_keep_priority():
+    rules = group("refund now", "need a refund")
+    assert rules.classify("I need a refund now").name == "w0"
+    assert group("bc", "ab").classify("abc").name == "w0"
+
+
+def test_lower_priority_regex_matches_alone():
+    rules = group("refund now", "need a refund")
+    assert rules.classify("I need a refund").name == "w1"
+    assert rules.classify("nothing here") is None
+
+
+def test_separate_regexes_keep_priority():
+    rules = group(r"(a)\1", "(?i)AA", "a")
+    assert rules.classify("xaay").name == "w0"
+    assert rules.classify("xay").name == "w2"
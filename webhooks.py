@@ -0,0 +1,464 @@
+"""
+Outgoing HTTP delivery to the n8n webhooks.
+
+A single `WebhookClient` owns one aiohttp session for the life of the process, so routed
+events reuse pooled keep-alive connections to each webhook host instead of paying for a new
+TCP (and TLS) handshake per message.
+
+Every event is written to `WebhookOutbox` (SQLite in WAL mode) before it is posted and is
+only acknowledged on a 2xx response. Anything that was not acknowledged is redelivered by a
+background worker with exponential backoff and jitter, including after a restart.
+
+Workflows can opt into `WebhookBatcher`, which posts their events as one
+{"batch": true, "count": n, "events": [...]} body per batch; their events are redelivered in
+the same envelope. Request bodies above
+N8N_GZIP_MIN_BYTES are sent gzip-compressed with Content-Encoding: gzip.
+"""
+
+import os
+import gzip
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+import serialization
+
+logger = logging.getLogger("telegram_mcp.webhooks")
+
+WEBHOOK_TIMEOUT = float(os.getenv("N8N_WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("N8N_MAX_CONNECTIONS", "100"))
+WEBHOOK_MAX_CONNECTIONS_PER_HOST = int(os.getenv("N8N_MAX_CONNECTIONS_PER_HOST", "20"))
+WEBHOOK_KEEPALIVE_SECONDS = float(os.getenv("N8N_KEEPALIVE_SECONDS", "60"))
+
+# Bodies at least this large are gzip-compressed (0 compresses everything, -1 disables)
+GZIP_MIN_BYTES = int(os.getenv("N8N_GZIP_MIN_BYTES", "4096"))
+
+# Redelivery backoff: base * 2^(attempts - 1), capped, with jitter
+RETRY_BASE_SECONDS = float(os.getenv("N8N_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("N8N_RETRY_MAX_SECONDS", "900"))
+# How many due events the worker posts at once
+REDELIVERY_CONCURRENCY = int(os.getenv("N8N_REDELIVERY_CONCURRENCY", "8"))
+# Delivered events and local message records are kept this long
+OUTBOX_RETENTION_SECONDS = float(os.getenv("N8N_OUTBOX_RETENTION_DAYS", "7")) * 86400
+
+
+class WebhookClient:
+    """Long-lived, pooled HTTP session for posting events to webhooks."""
+
+    def __init__(
+        self,
+        timeout: float = WEBHOOK_TIMEOUT,
+        limit: int = WEBHOOK_MAX_CONNECTIONS,
+        limit_per_host: int = WEBHOOK_MAX_CONNECTIONS_PER_HOST,
+        keepalive: float = WEBHOOK_KEEPALIVE_SECONDS,
+        gzip_min_bytes: int = GZIP_MIN_BYTES,
+    ):
+        self.timeout = timeout
+        self.gzip_min_bytes = gzip_min_bytes
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+        self.requests = 0
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use in the calling event loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def start(self) -> None:
+        self.session
+        logger.info(
+            f"Webhook session ready ({self.limit} connections, {self.limit_per_host} per host)"
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def post(self, url: str, payload: Any) -> Tuple[int, str]:
+        """POST `payload` as JSON and return the response status and body."""
+        body = serialization.dumps_bytes(payload)
+        headers = {"Content-Type": "application/json"}
+        self.bytes_uncompressed += len(body)
+        if 0 <= self.gzip_min_bytes <= len(body):
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        self.bytes_sent += len(body)
+        self.requests += 1
+        async with self.session.post(url, data=body, headers=headers) as response:
+            return response.status, await response.text()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "bytes_uncompressed": self.bytes_uncompressed,
+        }
+
+
+def is_success(status: int) -> bool:
+    return 200 <= status < 300
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff for the given number of failed attempts, with jitter."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookOutbox:
+    """
+    Durable, append-only record of webhook events backed by SQLite.
+
+    An event is inserted before its first delivery attempt and leased for the length of that
+    attempt, so the redelivery worker only picks it up once the attempt has failed or the
+    process died during it. The same database also keeps the local message log written by
+    `log_message`.
+    """
+
+    def __init__(self, db_path: str, client: WebhookClient):
+        self.db_path = db_path
+        self.client = client
+        self._db = None
+        self._task = None
+        self._wakeup = None
+        self.delivered = 0
+        self.redelivered = 0
+        self.failed_attempts = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS webhook_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    workflow TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    delivered_at REAL,
+                    batch_max INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS webhook_outbox_due
+                    ON webhook_outbox (next_attempt_at) WHERE delivered_at IS NULL;
+                CREATE TABLE IF NOT EXISTS message_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    storage_type TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                );
+                """)
+            columns = {
+                row["name"] for row in self._db.execute("PRAGMA table_info(webhook_outbox)")
+            }
+            if "batch_max" not in columns:
+                self._db.execute("ALTER TABLE webhook_outbox ADD COLUMN batch_max INTEGER")
+        return self._db
+
+    def enqueue(
+        self,
+        workflow: str,
+        url: str,
+        payload: Any,
+        deliver: bool = True,
+        hold: float = 0,
+        batch_max: Optional[int] = None,
+    ) -> int:
+        """
+        Persist an event. If the caller is about to post it (`deliver`), it is leased for that
+        first attempt plus `hold` seconds; otherwise it is handed straight to the redelivery
+        worker. Events of a batching workflow (`batch_max`) are redelivered as batches of at
+        most that many.
+        """
+        now = time.time()
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO webhook_outbox "
+                "(workflow, url, payload, created_at, next_attempt_at, batch_max) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    workflow,
+                    url,
+                    serialization.dumps(payload),
+                    now,
+                    now + self.lease + hold if deliver else now,
+                    batch_max,
+                ),
+            )
+        if not deliver and self._wakeup is not None:
+            self._wakeup.set()
+        return cur.lastrowid
+
+    @property
+    def lease(self) -> float:
+        return self.client.timeout + 5
+
+    def ack(self, event_id: int) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE webhook_outbox SET delivered_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (time.time(), event_id),
+            )
+        self.delivered += 1
+
+    def fail(self, event_id: int, error: str) -> float:
+        """Record a failed attempt and schedule the next one; returns the delay."""
+        with self.db:
+            row = self.db.execute(
+                "SELECT attempts FROM webhook_outbox WHERE id = ?", (event_id,)
+            ).fetchone()
+            attempts = (row["attempts"] if row else 0) + 1
+            delay = retry_delay(attempts)
+            self.db.execute(
+                "UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE id = ?",
+                (attempts, time.time() + delay, error[:500], event_id),
+            )
+        self.failed_attempts += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return delay
+
+    async def deliver(self, event_id: int, url: str, payload: Any) -> Tuple[bool, str]:
+        """Post one outbox event, acknowledging it on 2xx and rescheduling it otherwise."""
+        return await self._post([event_id], url, payload)
+
+    async def deliver_batch(self, url: str, events: List[Tuple[int, Any]]) -> Tuple[bool, str]:
+        """Post several outbox events to one webhook as a single batch body."""
+        body = {"batch": True, "count": len(events), "events": [p for _, p in events]}
+        return await self._post([event_id for event_id, _ in events], url, body)
+
+    async def _post(self, event_ids: List[int], url: str, body: Any) -> Tuple[bool, str]:
+        try:
+            status, text = await self.client.post(url, body)
+        except asyncio.TimeoutError:
+            status, text = None, "timeout"
+        except Exception as e:
+            status, text = None, f"{type(e).__name__}: {e}"
+        if status is not None and is_success(status):
+            for event_id in event_ids:
+                self.ack(event_id)
+            return True, text
+        error = f"HTTP {status}" if status is not None else text
+        for event_id in event_ids:
+            delay = self.fail(event_id, error)
+        logger.warning(
+            f"Webhook events {event_ids} failed ({error}), retrying in {delay:.0f}s or later"
+        )
+        return False, error
+
+    def due(self, limit: int) -> List[sqlite3.Row]:
+        """
+        Undelivered events whose next attempt is due, leasing them to the caller. For each of
+        the first `limit` events that belongs to a batching workflow, up to a batch's worth of
+        that workflow's other due events is leased along with it.
+        """
+        now = time.time()
+        query = (
+            "SELECT id, workflow, url, payload, batch_max FROM webhook_outbox "
+            "WHERE delivered_at IS NULL AND next_attempt_at <= ? {} "
+            "ORDER BY next_attempt_at, id LIMIT ?"
+        )
+        with self.db:
+            rows = self.db.execute(query.format(""), (now, limit)).fetchall()
+            batched: Dict[Tuple[str, int], int] = {}
+            for row in rows:
+                if row["batch_max"]:
+                    key = (row["workflow"], row["batch_max"])
+                    batched[key] = batched.get(key, 0) + 1
+            seen = {row["id"] for row in rows}
+            for (workflow, batch_max), count in batched.items():
+                more = self.db.execute(
+                    query.format("AND workflow = ? AND batch_max = ?"),
+                    (now, workflow, batch_max, batch_max * count),
+                ).fetchall()
+                rows += [row for row in more if row["id"] not in seen]
+                seen.update(row["id"] for row in more)
+            self.db.executemany(
+                "UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease, row["id"]) for row in rows],
+            )
+        return rows
+
+    def next_due_in(self) -> Optional[float]:
+        row = self.db.execute(
+            "SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE delivered_at IS NULL"
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def log_message(self, storage_type: str, record: Dict[str, Any]) -> int:
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO message_log (storage_type, record, stored_at) VALUES (?, ?, ?)",
+                (storage_type, serialization.dumps(record), time.time()),
+            )
+        return cur.lastrowid
+
+    def prune(self) -> None:
+        cutoff = time.time() - OUTBOX_RETENTION_SECONDS
+        with self.db:
+            self.db.execute("DELETE FROM webhook_outbox WHERE delivered_at < ?", (cutoff,))
+            self.db.execute("DELETE FROM message_log WHERE stored_at < ?", (cutoff,))
+
+    def stats(self) -> Dict[str, Any]:
+        row = self.db.execute(
+            "SELECT COUNT(*), MIN(created_at), MAX(attempts) FROM webhook_outbox "
+            "WHERE delivered_at IS NULL"
+        ).fetchone()
+        return {
+            "pending": row[0],
+            "oldest_pending_seconds": round(time.time() - row[1], 1) if row[1] else None,
+            "max_attempts": row[2] or 0,
+            "delivered": self.delivered,
+            "redelivered": self.redelivered,
+            "failed_attempts": self.failed_attempts,
+        }
+
+    def start(self) -> None:
+        """Start the redelivery worker on the running loop."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _redeliver(self, rows: List[sqlite3.Row]) -> int:
+        """Post due events, batching workflows' ones in their envelope; returns how many went."""
+        sends, counts = [], []
+        batches: Dict[Tuple[str, str, int], List[Tuple[int, Any]]] = {}
+        for row in rows:
+            payload = serialization.loads(row["payload"])
+            if row["batch_max"]:
+                key = (row["workflow"], row["url"], row["batch_max"])
+                batches.setdefault(key, []).append((row["id"], payload))
+            else:
+                sends.append(self.deliver(row["id"], row["url"], payload))
+                counts.append(1)
+        for (_, url, batch_max), events in batches.items():
+            for start in range(0, len(events), batch_max):
+                chunk = events[start : start + batch_max]
+                sends.append(self.deliver_batch(url, chunk))
+                counts.append(len(chunk))
+        results = await asyncio.gather(*sends)
+        return sum(count for (ok, _), count in zip(results, counts) if ok)
+
+    async def _run(self) -> None:
+        self.prune()
+        pruned_at = time.time()
+        while True:
+            try:
+                rows = self.due(REDELIVERY_CONCURRENCY)
+                if rows:
+                    self.redelivered += await self._redeliver(rows)
+                    continue
+                if time.time() - pruned_at > 3600:
+                    self.prune()
+                    pruned_at = time.time()
+                delay = self.next_due_in()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=60 if delay is None else min(delay, 60)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook redelivery worker error: {e}")
+                await asyncio.sleep(5)
+
+
+class WebhookBatcher:
+    """
+    Groups outbox events per workflow into one POST, sent when `max_events` are waiting or
+    the oldest has waited `max_latency` seconds. Events are in the outbox before they are
+    batched and marked as batched there, so a failed batch is redelivered as batches too.
+    """
+
+    def __init__(self, outbox: WebhookOutbox):
+        self.outbox = outbox
+        self._pending: Dict[str, List[Tuple[int, Any]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._urls: Dict[str, str] = {}
+        self._sending = set()
+        self.stats = {"events": 0, "batches": 0}
+
+    def add(
+        self, workflow: str, url: str, payload: Any, max_events: int, max_latency: float
+    ) -> int:
+        event_id = self.outbox.enqueue(
+            workflow, url, payload, hold=max_latency, batch_max=max_events
+        )
+        pending = self._pending.setdefault(workflow, [])
+        pending.append((event_id, payload))
+        self._urls[workflow] = url
+        self.stats["events"] += 1
+        if len(pending) >= max_events:
+            self.flush(workflow)
+        elif workflow not in self._timers:
+            self._timers[workflow] = asyncio.get_running_loop().call_later(
+                max_latency, self.flush, workflow
+            )
+        return event_id
+
+    def flush(self, workflow: str) -> None:
+        timer = self._timers.pop(workflow, None)
+        if timer is not None:
+            timer.cancel()
+        events = self._pending.pop(workflow, None)
+        if not events:
+            return
+        self.stats["batches"] += 1
+        task = asyncio.get_running_loop().create_task(
+            self.outbox.deliver_batch(self._urls[workflow], events)
+        )
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def close(self) -> None:
+        """Send what is waiting and wait for the batches in flight."""
+        for workflow in list(self._pending):
+            self.flush(workflow)
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "waiting": sum(len(events) for events in self._pending.values()),
+            "in_flight": len(self._sending),
+        }